@@ -0,0 +1,89 @@
+import json
+import os
+import time
+
+import cv2
+from dotenv import load_dotenv
+
+from src.evaluation.ParallelEvaluator import ParallelEvaluator, close_worker
+from src.evaluation.PCKCalculator import PCKCalculator
+from src.evaluation.PCKEngine import PCKEngine
+from src.evaluation.recognizer import Recognizer
+from src.main import IR_GROUND_TRUTH, IR_IMAGE_DIRECTORY, STYLIZED_PICTURES_DIRECTORY, load_ground_truth
+from src.pipelines.PipelineManager import IMAGE_EXTENSIONS, PipelineManager
+
+INFERENCE_SIZES = [(128, 128), (192, 192), (256, 256), (320, 320)]
+OUTPUT_SIZES = [None, 1024, 512]
+THRESHOLD = 0.05
+LATENCY_IMAGES = 8
+OUTPUT_FILE = "colorization_resolution.json"
+
+
+def measure_latency(pipeline_manager, image_directory, image_rotation=cv2.ROTATE_90_COUNTERCLOCKWISE):
+    """
+    :return: Mean time in seconds of the colorization stage per image, on the first images of the directory
+        once they went through the stages before it, as in the evaluation.
+    """
+    image_names = sorted(file_name for file_name in os.listdir(image_directory)
+                         if file_name.lower().endswith(IMAGE_EXTENSIONS))[:LATENCY_IMAGES]
+    stages = pipeline_manager.first_pipeline_stages('siggraph17')
+    preprocessing_stages, colorization_stage = stages[:-1], stages[-1]
+
+    images = []
+    for image_name in image_names:
+        image = cv2.imread(os.path.join(image_directory, image_name))
+        if image_rotation is not None:
+            image = cv2.rotate(image, image_rotation)
+        images.append(pipeline_manager.run_stages(image, preprocessing_stages, image_name))
+
+    colorization_stage.function(images[0])  # warm up
+    start = time.perf_counter()
+    for image in images:
+        colorization_stage.function(image)
+    return (time.perf_counter() - start) / len(images)
+
+
+def run(inference_sizes=INFERENCE_SIZES, output_sizes=OUTPUT_SIZES, threshold=THRESHOLD, processes=1):
+    """
+    Sweep the colorization inference and output sizes against colorization latency and PCK.
+
+    :param inference_sizes: (height, width) of the L channel fed to the colorizer.
+    :param output_sizes: Resolutions of the colorized images, see output_shape.
+    :param threshold: Distance threshold factor of the PCK.
+    :param processes: Number of worker processes recognizing the images.
+    :return: List of results, one per combination of sizes.
+    """
+    ground_truth = load_ground_truth(IR_GROUND_TRUTH).rotated_90_counterclockwise()
+
+    results = []
+    for inference_size in inference_sizes:
+        for output_size in output_sizes:
+            pipeline_options = {"colorization_size": inference_size, "colorization_output_size": output_size}
+            latency = measure_latency(PipelineManager(STYLIZED_PICTURES_DIRECTORY, **pipeline_options),
+                                      IR_IMAGE_DIRECTORY)
+
+            with ParallelEvaluator(processes=processes, base_output_path=STYLIZED_PICTURES_DIRECTORY,
+                                   pipeline_options=pipeline_options) as evaluator:
+                landmarks, predictions = evaluator.collect_pipeline_landmarks(IR_IMAGE_DIRECTORY, ground_truth,
+                                                                              cv2.ROTATE_90_COUNTERCLOCKWISE)
+            result = {"inference_size": list(inference_size), "output_size": output_size,
+                      "colorization_latency_ms": latency * 1000}
+            for name in ["final", "first"]:
+                engine = PCKEngine(landmarks, predictions[name])
+                result[f"{name}_pck"] = PCKCalculator.calculate_final_pck(engine.calculate_total_pck(threshold))
+            print(result)
+            results.append(result)
+
+    return results
+
+
+if __name__ == "__main__":
+    load_dotenv()
+    try:
+        results = run()
+    finally:
+        close_worker()
+        Recognizer.close_shared()
+    with open(OUTPUT_FILE, 'w') as f:
+        json.dump(results, f, indent=4)
+    print(f"Results saved to '{OUTPUT_FILE}'")
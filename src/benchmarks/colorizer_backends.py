@@ -0,0 +1,75 @@
+import json
+import os
+import sys
+import time
+
+import torch
+
+from src.colorization.Zhang import (COLORIZER_BACKENDS, ab_channel_error, example_input, get_colorizer, load_img,
+                                    preprocess_img)
+from src.pipelines.PipelineManager import IMAGE_EXTENSIONS
+
+REPEATS = 10
+MAX_IMAGES = 16
+
+
+def load_inputs(image_directory=None):
+    """
+    :param image_directory: Directory of images to colorize, random L channels are used if None.
+    :return: L channel batch of shape (N, 1, 256, 256).
+    """
+    if image_directory is None:
+        return example_input(4)
+
+    image_names = sorted(file_name for file_name in os.listdir(image_directory)
+                         if file_name.lower().endswith(IMAGE_EXTENSIONS))[:MAX_IMAGES]
+    return torch.cat([preprocess_img(load_img(os.path.join(image_directory, image_name)))[1]
+                      for image_name in image_names], dim=0)
+
+
+def measure_latency(colorizer, input_l):
+    with torch.inference_mode():
+        colorizer(input_l[:1])  # warm up, compiles for 'compile'
+        start = time.perf_counter()
+        for index in range(REPEATS):
+            colorizer(input_l[index % len(input_l)][None])
+    return (time.perf_counter() - start) / REPEATS
+
+
+def run(model='siggraph17', backends=COLORIZER_BACKENDS, image_directory=None):
+    """
+    Measure the per-image latency of every colorizer backend and its ab channel error against eager float32.
+    The downstream PCK of a backend is obtained by running main.py with COLORIZER_BACKEND set to it.
+
+    :param model: Name of the colorizer.
+    :param backends: Backends to measure.
+    :param image_directory: Directory of images used as inputs, random L channels if None.
+    :return: dict mapping each backend to its latency and ab error, or to the error that prevented building it.
+    """
+    input_l = load_inputs(image_directory)
+    reference = get_colorizer(model, backend='eager')
+    # 'int8_static' is calibrated on the measured images when there are some
+    calibration_inputs = list(input_l.split(4)) if image_directory is not None else None
+
+    results = {}
+    for backend in backends:
+        try:
+            colorizer = get_colorizer(model, backend=backend, calibration_inputs=calibration_inputs)
+        except (ImportError, RuntimeError) as e:
+            results[backend] = {"error": str(e)}
+            continue
+
+        latency = measure_latency(colorizer, input_l)
+        results[backend] = {"latency_ms": latency * 1000, **ab_channel_error(reference, colorizer, input_l)}
+
+    eager_latency = results["eager"]["latency_ms"] if "latency_ms" in results.get("eager", {}) else None
+    if eager_latency:
+        for result in results.values():
+            if "latency_ms" in result:
+                result["speedup"] = eager_latency / result["latency_ms"]
+    return results
+
+
+if __name__ == "__main__":
+    # Optional image directory, e.g. the inverted IR images written with SAVE_ARTIFACTS
+    print(json.dumps(run(image_directory=sys.argv[1] if len(sys.argv) > 1 else None), indent=4))
@@ -0,0 +1,49 @@
+import time
+
+import numpy as np
+from skimage import color
+
+from src.colorization.Zhang import lab2rgb_fast, rgb2l
+
+SHAPES = [(480, 640), (1080, 1920), (3000, 4000)]
+REPEATS = 5
+
+# Maximum absolute differences accepted against skimage by the tests, in L units and in [0, 1] RGB units
+L_TOLERANCE = 1e-3
+RGB_TOLERANCE = 1e-4
+
+
+def make_images(shape, seed=0):
+    rng = np.random.default_rng(seed)
+    img_rgb = rng.integers(0, 256, (*shape, 3), dtype=np.uint8)
+    img_lab = color.rgb2lab(img_rgb)
+    # Predicted ab channels are not those of the input, perturb them
+    img_lab[..., 1:] += rng.normal(0, 20, img_lab[..., 1:].shape)
+    return img_rgb, img_lab
+
+
+def measure(function, argument):
+    function(argument)  # warm up
+    start = time.perf_counter()
+    for _ in range(REPEATS):
+        function(argument)
+    return (time.perf_counter() - start) / REPEATS * 1000
+
+
+def run(shapes=SHAPES):
+    # The tolerances against skimage are checked in tests/test_lab_conversion.py
+    results = {}
+    for shape in shapes:
+        img_rgb, img_lab = make_images(shape)
+        results[f"{shape[0]}x{shape[1]}"] = {
+            "rgb2lab_ms": measure(color.rgb2lab, img_rgb),
+            "rgb2l_ms": measure(rgb2l, img_rgb),
+            "rgb2l_gray_ms": measure(rgb2l, img_rgb[..., 0]),
+            "lab2rgb_ms": measure(color.lab2rgb, img_lab),
+            "lab2rgb_fast_ms": measure(lab2rgb_fast, img_lab),
+        }
+    return results
+
+
+if __name__ == "__main__":
+    print(run())
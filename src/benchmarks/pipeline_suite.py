@@ -0,0 +1,304 @@
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import queue as queue_module
+import resource
+import subprocess
+import tempfile
+import time
+from types import SimpleNamespace
+
+import cv2
+import numpy as np
+import torch
+from dotenv import load_dotenv
+
+from src.colorization.Zhang import SIGGRAPHGenerator, colorize_batch
+from src.evaluation.GroundTruthStore import GroundTruthStore
+from src.evaluation.LandmarkMerger import LandmarkMerger
+from src.evaluation.PCKEngine import NUM_LANDMARKS, PCKEngine
+from src.evaluation.recognizer import Recognizer
+from src.pipelines.PipelineManager import PipelineManager
+from src.pipelines.TemperatureBoxRemover import TemperatureBoxRemover
+
+RESOLUTIONS = [(480, 640), (720, 1280), (1080, 1920)]
+BATCH_SIZES = [1, 4, 8]
+REPEATS = 5
+NUM_ANNOTATED_IMAGES = 500
+PCK_THRESHOLDS = np.linspace(0.0, 0.15, 31)
+OUTPUT_FILE = "benchmark_results.json"
+
+# BGR colors of the red and green temperature boxes drawn on the synthetic frames
+BOX_COLORS = ((0, 0, 255), (0, 200, 0))
+
+
+def synthetic_ir_frame(shape, seed=0):
+    """
+    Synthetic IR frame: a smooth gray background, two warm hand-like blobs and temperature boxes with readings.
+
+    :param shape: (height, width) of the frame.
+    :param seed: Seed of the random placement.
+    :return: BGR uint8 image.
+    """
+    rng = np.random.default_rng(seed)
+    height, width = shape
+    gradient = np.linspace(40, 90, width, dtype=np.float32)[None, :].repeat(height, axis=0)
+    frame = gradient + rng.normal(0, 3, shape).astype(np.float32)
+
+    for _ in range(2):
+        center = (int(rng.uniform(0.2, 0.8) * width), int(rng.uniform(0.3, 0.7) * height))
+        axes = (int(0.08 * width), int(0.15 * height))
+        cv2.ellipse(frame, center, axes, rng.uniform(0, 180), 0, 360, float(rng.uniform(170, 220)), -1)
+    frame = cv2.GaussianBlur(frame, (0, 0), 5)
+    frame = cv2.cvtColor(np.clip(frame, 0, 255).astype(np.uint8), cv2.COLOR_GRAY2BGR)
+
+    box_size = (max(40, width // 12), max(20, height // 24))
+    for index, color in enumerate(BOX_COLORS):
+        x = int(rng.uniform(0.05, 0.85) * width)
+        y = int(rng.uniform(0.05, 0.9) * height)
+        cv2.rectangle(frame, (x, y), (x + box_size[0], y + box_size[1]), color, 2)
+        cv2.putText(frame, f"{rng.uniform(30, 37):.1f}", (x + 4, y + box_size[1] - 6), cv2.FONT_HERSHEY_SIMPLEX,
+                    box_size[1] / 40, color, 1)
+    return frame
+
+
+def synthetic_landmarks(num_images, seed=0):
+    """
+    :return: Random normalized landmarks of two hands per image, of shape (N_images, 2, 21, 2).
+    """
+    rng = np.random.default_rng(seed)
+    centers = rng.uniform(0.25, 0.75, (num_images, 2, 1, 2))
+    return np.clip(centers + rng.normal(0, 0.05, (num_images, 2, NUM_LANDMARKS, 2)), 0, 1)
+
+
+def write_synthetic_annotations(directory, landmarks, files=5):
+    """
+    Write landmarks as JSON annotation files in the format of the evaluation dataset.
+
+    :return: Names of the annotated images.
+    """
+    image_names = [f"{index}_synthetic.png" for index in range(len(landmarks))]
+    for file_index, indices in enumerate(np.array_split(np.arange(len(landmarks)), files)):
+        entries = [{"image": image_names[index],
+                    "landmarks": [[{"x": float(x), "y": float(y)} for x, y in hand] for hand in landmarks[index]]}
+                   for index in indices]
+        with open(os.path.join(directory, f"annotations_{file_index}.json"), 'w') as f:
+            json.dump(entries, f)
+    return image_names
+
+
+def synthetic_results(landmarks, rng):
+    """
+    :param landmarks: Landmarks of the hands of an image, of shape (hands, 21, 2).
+    :return: Object with the attributes of a MediaPipe GestureRecognizerResult.
+    """
+    def category(name):
+        return [SimpleNamespace(category_name=name, score=float(rng.uniform(0.3, 1.0)))]
+
+    hands = [[SimpleNamespace(x=float(x), y=float(y), z=0.0) for x, y in hand] for hand in landmarks]
+    return SimpleNamespace(hand_landmarks=hands,
+                           gestures=[category(rng.choice(["Open_Palm", "None"])) for _ in hands],
+                           handedness=[category("Left") for _ in hands])
+
+
+def time_call(function, repeats=REPEATS):
+    """
+    :return: dict
+        Mean and minimum time of a call in milliseconds, after one warm up call.
+    """
+    function()
+    times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        function()
+        times.append((time.perf_counter() - start) * 1000)
+    return {"mean_ms": float(np.mean(times)), "min_ms": float(np.min(times))}
+
+
+def make_colorizer():
+    # Random weights have the cost of the pretrained ones and keep the suite offline
+    torch.manual_seed(0)
+    return SIGGRAPHGenerator().eval().requires_grad_(False)
+
+
+def measure_stages(shape):
+    """
+    :return: dict with the latency of every pipeline stage on one frame of the given resolution.
+    """
+    frame = synthetic_ir_frame(shape)
+    pipeline_manager = PipelineManager(save_artifacts=False)
+    hsv_ranges = pipeline_manager.temperature_box_hsv_ranges
+    no_boxes = pipeline_manager.no_boxes_stage().function(frame)
+    gray_no_boxes = cv2.cvtColor(no_boxes, cv2.COLOR_BGR2GRAY)
+    colorizer = make_colorizer()
+    rgb_inverted = cv2.cvtColor(pipeline_manager.invert_image(no_boxes), cv2.COLOR_BGR2RGB)
+
+    roi_remover = TemperatureBoxRemover(hsv_ranges)
+    reusing_remover = TemperatureBoxRemover(hsv_ranges, reuse_mask=True, rescan_interval=REPEATS + 1)
+
+    stages = {
+        "no_boxes_full": lambda: pipeline_manager.remove_temperature_boxes_from_image(frame, hsv_ranges),
+        "no_boxes_full_grayscale": lambda: pipeline_manager.remove_temperature_boxes_from_image(frame, hsv_ranges,
+                                                                                                True),
+        "no_boxes_roi": lambda: roi_remover.remove(frame),
+        "no_boxes_roi_reused_mask": lambda: reusing_remover.remove(frame),
+        "invert": lambda: pipeline_manager.invert_image(no_boxes),
+        "invert_grayscale": lambda: pipeline_manager.invert_image(gray_no_boxes),
+        "clahe": lambda: pipeline_manager.apply_clahe(no_boxes),
+        "colorize": lambda: colorize_batch([rgb_inverted], model=colorizer, batch_size=1),
+    }
+
+    model_path = os.getenv("MODEL_PATH")
+    if model_path and os.path.exists(model_path):
+        with Recognizer(model_path) as recognizer:
+            results = {name: time_call(function) for name, function in stages.items()}
+            results["recognize"] = time_call(lambda: recognizer.recognize_landmarks_gestures_from_image(no_boxes))
+        return results
+
+    results = {name: time_call(function) for name, function in stages.items()}
+    results["recognize"] = {"skipped": "MODEL_PATH is not set to an existing gesture recognizer model."}
+    return results
+
+
+def measure_throughput(shape, batch_size):
+    """
+    :return: Frames per second of box removal, inversion and colorization of batches of frames.
+    """
+    frames = [synthetic_ir_frame(shape, seed) for seed in range(batch_size)]
+    colorizer = make_colorizer()
+    pipeline_manager = PipelineManager(save_artifacts=False)
+
+    def run_batch():
+        inverted = [cv2.cvtColor(pipeline_manager.invert_image(pipeline_manager.no_boxes_stage().function(frame)),
+                                 cv2.COLOR_BGR2RGB) for frame in frames]
+        colorize_batch(inverted, model=colorizer, batch_size=batch_size)
+
+    timing = time_call(run_batch, repeats=max(1, REPEATS // 2))
+    return {"fps": batch_size * 1000 / timing["mean_ms"], **timing}
+
+
+def measure_evaluation(num_images=NUM_ANNOTATED_IMAGES):
+    """
+    :return: dict with the latency of parsing annotations, merging landmarks and scoring PCK on synthetic data.
+    """
+    rng = np.random.default_rng(0)
+    ground_truth = synthetic_landmarks(num_images)
+    predictions = ground_truth + rng.normal(0, 0.01, ground_truth.shape)
+    pipeline_results = [(synthetic_results(prediction, rng), synthetic_results(prediction[::-1], rng))
+                        for prediction in predictions[:100]]
+
+    with tempfile.TemporaryDirectory() as directory:
+        write_synthetic_annotations(directory, ground_truth)
+        results = {
+            "parse_annotations": time_call(lambda: GroundTruthStore.from_directory(directory, excluded_prefixes=())),
+        }
+
+    def merge_all():
+        for first_results, second_results in pipeline_results:
+            LandmarkMerger(first_results, second_results).merge_landmarks()
+
+    results["merge_100_images"] = time_call(merge_all)
+    results["pck_curve"] = time_call(lambda: PCKEngine(ground_truth, predictions).calculate_final_pck(PCK_THRESHOLDS))
+    return results
+
+
+def _run_case(case, queue):
+    kind, arguments = case
+    if kind == "resolution":
+        shape, batch_sizes = arguments
+        result = {"stages": measure_stages(shape),
+                  "throughput": {str(batch_size): measure_throughput(shape, batch_size)
+                                 for batch_size in batch_sizes}}
+    else:
+        result = measure_evaluation(*arguments)
+
+    # ru_maxrss is reported in kilobytes on Linux
+    result["peak_rss_mb"] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    queue.put(result)
+
+
+def run_case(case):
+    """
+    Run a benchmark case in a fresh process, so that its peak resident set size is its own.
+    """
+    context = multiprocessing.get_context('spawn')
+    queue = context.Queue()
+    process = context.Process(target=_run_case, args=(case, queue))
+    process.start()
+    while True:
+        try:
+            result = queue.get(timeout=1)
+            break
+        except queue_module.Empty:
+            if not process.is_alive():
+                raise RuntimeError(f"Benchmark case {case[0]} failed with exit code {process.exitcode}.")
+    process.join()
+    return result
+
+
+def environment():
+    try:
+        commit = subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True,
+                                check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {"commit": commit, "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"), "python": platform.python_version(),
+            "platform": platform.platform(), "cpu_count": os.cpu_count(), "torch": torch.__version__,
+            "torch_threads": torch.get_num_threads(), "opencv": cv2.__version__, "numpy": np.__version__}
+
+
+def run(resolutions=RESOLUTIONS, batch_sizes=BATCH_SIZES):
+    """
+    Run the whole suite.
+
+    :param resolutions: (height, width) of the synthetic frames.
+    :param batch_sizes: Colorization batch sizes of the throughput measurements.
+    :return: dict with the environment, per resolution stage latencies, throughput and peak memory, and the
+        evaluation latencies.
+    """
+    results = {"environment": environment(), "resolutions": {}}
+    for shape in resolutions:
+        print(f"Benchmarking {shape[0]}x{shape[1]} frames...")
+        results["resolutions"][f"{shape[0]}x{shape[1]}"] = run_case(("resolution", (shape, batch_sizes)))
+    print("Benchmarking the evaluation...")
+    results["evaluation"] = run_case(("evaluation", (NUM_ANNOTATED_IMAGES,)))
+    return results
+
+
+def compare(baseline, current, prefix=""):
+    """
+    Compare two results of run, e.g. of two commits.
+
+    :return: dict mapping every timing, throughput and memory value to its ratio current / baseline.
+    """
+    ratios = {}
+    for key, value in current.items():
+        if key == "environment" or key not in baseline:
+            continue
+        name = f"{prefix}{key}"
+        if isinstance(value, dict):
+            ratios.update(compare(baseline[key], value, f"{name}."))
+        elif isinstance(value, (int, float)) and isinstance(baseline[key], (int, float)) and baseline[key]:
+            ratios[name] = value / baseline[key]
+    return ratios
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="End-to-end benchmark of the IR landmark pipeline.")
+    parser.add_argument("--output", default=OUTPUT_FILE, help="JSON file the results are written to.")
+    parser.add_argument("--baseline", help="Results of an earlier run to compare with.")
+    arguments = parser.parse_args()
+    # MODEL_PATH enables the recognition benchmark
+    load_dotenv()
+
+    suite_results = run()
+    with open(arguments.output, 'w') as f:
+        json.dump(suite_results, f, indent=4)
+    print(f"Results saved to '{arguments.output}'")
+
+    if arguments.baseline:
+        with open(arguments.baseline) as f:
+            for name, ratio in compare(json.load(f), suite_results).items():
+                print(f"{name}: {ratio:.2f}x")
@@ -0,0 +1,100 @@
+import multiprocessing
+import resource
+import time
+
+import torch
+
+from src.colorization.Zhang import SIGGRAPHGenerator
+
+HW = (256, 256)
+REPEATS = 10
+
+
+def legacy_forward(model, input_A):
+    """
+    SIGGRAPHGenerator.forward as it was before the duplicated decoder pass was removed.
+    """
+    input_B = torch.cat((input_A * 0, input_A * 0), dim=1)
+    mask_B = input_A * 0
+
+    conv1_2 = model.model1(torch.cat((model.normalize_l(input_A), model.normalize_ab(input_B), mask_B), dim=1))
+    conv2_2 = model.model2(conv1_2[:, :, ::2, ::2])
+    conv3_3 = model.model3(conv2_2[:, :, ::2, ::2])
+    conv4_3 = model.model4(conv3_3[:, :, ::2, ::2])
+    conv5_3 = model.model5(conv4_3)
+    conv6_3 = model.model6(conv5_3)
+    conv7_3 = model.model7(conv6_3)
+
+    conv8_up = model.model8up(conv7_3) + model.model3short8(conv3_3)
+    conv8_3 = model.model8(conv8_up)
+    conv9_up = model.model9up(conv8_3) + model.model2short9(conv2_2)
+    conv9_3 = model.model9(conv9_up)
+    conv10_up = model.model10up(conv9_3) + model.model1short10(conv1_2)
+    conv10_2 = model.model10(conv10_up)
+    out_reg = model.model_out(conv10_2)
+
+    conv9_up = model.model9up(conv8_3) + model.model2short9(conv2_2)
+    conv9_3 = model.model9(conv9_up)
+    conv10_up = model.model10up(conv9_3) + model.model1short10(conv1_2)
+    conv10_2 = model.model10(conv10_up)
+    out_reg = model.model_out(conv10_2)
+
+    return model.unnormalize_ab(out_reg)
+
+
+def make_model_and_input(seed=0):
+    # Random weights are enough to compare both forward passes and keep the benchmark offline
+    torch.manual_seed(seed)
+    model = SIGGRAPHGenerator().eval()
+    input_l = torch.rand(1, 1, *HW) * 100
+    return model, input_l
+
+
+def _measure(variant, queue):
+    model, input_l = make_model_and_input()
+    forward = model if variant == 'corrected' else (lambda x: legacy_forward(model, x))
+
+    with torch.inference_mode():
+        forward(input_l)  # warm up
+        rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        start = time.perf_counter()
+        for _ in range(REPEATS):
+            forward(input_l)
+        latency = (time.perf_counter() - start) / REPEATS
+        rss_after = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    # ru_maxrss is reported in kilobytes on Linux
+    queue.put({"latency_ms": latency * 1000, "peak_rss_mb": rss_after / 1024,
+               "peak_rss_growth_mb": (rss_after - rss_before) / 1024})
+
+
+def measure(variant):
+    """
+    Measure the latency and peak memory of one forward variant in a fresh process, so that the peak
+    resident set size is not polluted by the other variant.
+
+    :param variant: 'legacy' or 'corrected'.
+    :return: dict with latency and peak memory.
+    """
+    context = multiprocessing.get_context('spawn')
+    queue = context.Queue()
+    process = context.Process(target=_measure, args=(variant, queue))
+    process.start()
+    result = queue.get()
+    process.join()
+    return result
+
+
+def run():
+    # Both forward passes return the same ab channels, see tests/test_siggraph17_decoder.py
+    results = {}
+    for variant in ['legacy', 'corrected']:
+        results[variant] = measure(variant)
+
+    results["latency_saved_ms"] = results["legacy"]["latency_ms"] - results["corrected"]["latency_ms"]
+    results["peak_rss_saved_mb"] = results["legacy"]["peak_rss_mb"] - results["corrected"]["peak_rss_mb"]
+    return results
+
+
+if __name__ == "__main__":
+    print(run())
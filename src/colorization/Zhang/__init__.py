@@ -3,5 +3,8 @@ from .base_color import *
 from .eccv16 import *
 from .siggraph17 import *
 from .util import *
+from .weights import *
+from .acceleration import *
+from .model_registry import *
 from .creating_pictures import *
 from .creating_pictures import create_colorized_pictures
@@ -0,0 +1,196 @@
+import copy
+import os
+import tempfile
+
+import torch
+from torch import nn
+
+from src.utils.atomic_write import atomic_write
+
+from .util import preprocess_img
+
+COLORIZER_BACKENDS = ('eager', 'channels_last', 'bf16', 'compile', 'int8_static', 'torchscript', 'onnx')
+
+# Backends that only produce CPU models
+CPU_ONLY_BACKENDS = ('bf16', 'int8_static', 'onnx')
+
+# Resolution of the L channel fed to the colorizers
+EXAMPLE_HW = (256, 256)
+
+
+class ChannelsLastColorizer(nn.Module):
+    """
+    Runs a colorizer with its weights and inputs in channels_last memory format.
+    """
+
+    def __init__(self, model):
+        super().__init__()
+        self.model = model.to(memory_format=torch.channels_last)
+
+    def forward(self, input_l):
+        return self.model(input_l.contiguous(memory_format=torch.channels_last)).contiguous()
+
+
+class AutocastColorizer(nn.Module):
+    """
+    Runs a float32 colorizer under CPU autocast, so that convolutions compute in bfloat16.
+    """
+
+    def __init__(self, model, dtype=torch.bfloat16):
+        super().__init__()
+        self.model = model
+        self.dtype = dtype
+
+    def forward(self, input_l):
+        with torch.autocast('cpu', dtype=self.dtype):
+            return self.model(input_l).float()
+
+
+class LOnlyColorizer(nn.Module):
+    """
+    Calls a colorizer with the L channel only, so that tracers see a single tensor input.
+    """
+
+    def __init__(self, model):
+        super().__init__()
+        self.model = model
+
+    def forward(self, input_l):
+        return self.model(input_l)
+
+
+class OnnxColorizer(nn.Module):
+    """
+    Runs a colorizer exported to ONNX with onnxruntime.
+    """
+
+    def __init__(self, onnx_path, num_threads=None):
+        super().__init__()
+        try:
+            import onnxruntime
+        except ImportError as e:
+            raise ImportError("The 'onnx' colorizer backend requires the onnxruntime package.") from e
+
+        session_options = onnxruntime.SessionOptions()
+        session_options.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if num_threads:
+            session_options.intra_op_num_threads = num_threads
+        self.onnx_path = onnx_path
+        self.session = onnxruntime.InferenceSession(onnx_path, session_options, providers=['CPUExecutionProvider'])
+
+    def forward(self, input_l):
+        (output,) = self.session.run(None, {"input_l": input_l.float().cpu().numpy()})
+        return torch.from_numpy(output)
+
+
+def example_input(batch_size=1, hw=EXAMPLE_HW):
+    """
+    :return: Random L channel batch in [0, 100], used to trace and calibrate the colorizers.
+    """
+    generator = torch.Generator().manual_seed(0)
+    return torch.rand(batch_size, 1, *hw, generator=generator) * 100
+
+
+def calibration_batches(images, inference_size=EXAMPLE_HW, batch_size=4):
+    """
+    Turn representative images into the L channel batches that calibrate 'int8_static'.
+
+    :param images: RGB or single channel images, e.g. inverted IR frames without temperature boxes.
+    :param inference_size: (height, width) of the L channel fed to the colorizer.
+    :param batch_size: Number of images per calibration batch.
+    :return: List of L channel batches of shape (N, 1, H, W).
+    """
+    l_channels = [preprocess_img(image, HW=tuple(inference_size))[1] for image in images]
+    return [torch.cat(l_channels[start:start + batch_size], dim=0) for start in range(0, len(l_channels), batch_size)]
+
+
+def quantize_static(model, calibration_inputs=None):
+    """
+    Quantize the convolutions of a colorizer to int8 with FX graph mode post-training static quantization.
+
+    :param model: Float32 colorizer in eval mode.
+    :param calibration_inputs: L channel batches observed to choose the activation ranges, see
+        calibration_batches. Random L channels if None, which give poor ranges for IR images.
+    :return: The quantized colorizer.
+    """
+    from torch.ao.quantization import get_default_qconfig_mapping
+    from torch.ao.quantization.quantize_fx import convert_fx, prepare_fx
+
+    if calibration_inputs is None:
+        calibration_inputs = [example_input(4)]
+
+    prepared = prepare_fx(LOnlyColorizer(model), get_default_qconfig_mapping('x86'),
+                          example_inputs=(calibration_inputs[0],))
+    with torch.no_grad():
+        for input_l in calibration_inputs:
+            prepared(input_l)
+    return convert_fx(prepared)
+
+
+def export_onnx(model, onnx_path, opset_version=17):
+    """
+    Export a colorizer to ONNX, with dynamic batch size and resolution.
+
+    :param model: Float32 colorizer in eval mode.
+    :param onnx_path: Path of the written .onnx file.
+    :param opset_version: ONNX opset to export to.
+    """
+    os.makedirs(os.path.dirname(onnx_path) or '.', exist_ok=True)
+    dynamic_axes = {"input_l": {0: "batch", 2: "height", 3: "width"},
+                    "ab": {0: "batch", 2: "height", 3: "width"}}
+    atomic_write(onnx_path, lambda tmp_path: torch.onnx.export(
+        LOnlyColorizer(model), (example_input(),), tmp_path, input_names=["input_l"], output_names=["ab"],
+        dynamic_axes=dynamic_axes, opset_version=opset_version))
+
+
+def accelerate(model, backend='eager', calibration_inputs=None, onnx_path=None):
+    """
+    Prepare a colorizer for CPU inference with one of COLORIZER_BACKENDS. The model is copied first, so the
+    eager colorizer stays usable as a reference.
+
+    :param model: Float32 colorizer in eval mode.
+    :param backend: Name of the inference backend.
+    :param calibration_inputs: L channel batches used by 'int8_static', see quantize_static.
+    :param onnx_path: Path of the exported model for 'onnx', a temporary file if None.
+    :return: A module mapping an L channel batch of shape (N, 1, H, W) to float32 ab channels.
+    """
+    if backend not in COLORIZER_BACKENDS:
+        raise ValueError(f"Unknown colorizer backend '{backend}', expected one of {COLORIZER_BACKENDS}.")
+    if backend == 'eager':
+        return model
+
+    model = copy.deepcopy(model).eval()
+    if backend == 'channels_last':
+        return ChannelsLastColorizer(model)
+    if backend == 'bf16':
+        return AutocastColorizer(model)
+    if backend == 'compile':
+        return torch.compile(model)
+    if backend == 'int8_static':
+        return quantize_static(model, calibration_inputs)
+    if backend == 'torchscript':
+        with torch.no_grad():
+            traced = torch.jit.trace(LOnlyColorizer(model), (example_input(),))
+        return torch.jit.optimize_for_inference(torch.jit.freeze(traced.eval()))
+
+    if onnx_path is None:
+        onnx_path = os.path.join(tempfile.mkdtemp(prefix='colorizer-'), 'colorizer.onnx')
+    export_onnx(model, onnx_path)
+    return OnnxColorizer(onnx_path)
+
+
+def ab_channel_error(reference, candidate, input_l):
+    """
+    Compare the ab channels predicted by an accelerated colorizer with those of the reference colorizer.
+
+    :param reference: Eager float32 colorizer.
+    :param candidate: Accelerated colorizer.
+    :param input_l: L channel batch of shape (N, 1, H, W).
+    :return: dict
+        Mean and maximum absolute ab difference, in ab units (the ab channels span about [-110, 110]).
+    """
+    with torch.inference_mode():
+        expected = reference(input_l).float()
+        actual = candidate(input_l).float()
+    difference = (actual - expected).abs()
+    return {"ab_mae": float(difference.mean()), "ab_max": float(difference.max())}
@@ -1,55 +1,99 @@
 import os
 import matplotlib.pyplot as plt
 import torch
-from src.colorization.Zhang import eccv16, siggraph17, load_img, preprocess_img, postprocess_tens
+from src.colorization.Zhang import get_colorizer, load_img, preprocess_img, postprocess_tens, resize_img
+
+# Resolution at which the colorizers were trained
+INFERENCE_SIZE = (256, 256)
+
+# Side of the square crop the MediaPipe hand landmark model takes around each hand, from the full-resolution
+# image. A smaller colorized output only keeps the landmark input intact while the hands stay this many pixels
+# across; the 192x192 letterbox of the palm detector does not bound it
+HAND_LANDMARK_INPUT_SIZE = 224
+
+
+def output_shape(shape, output_size=None):
+    """
+    :param shape: (height, width) of the original image.
+    :param output_size: None to keep the original resolution, an int for the length of the longest side with
+        the aspect ratio kept, or a (height, width) tuple.
+    :return: (height, width) of the colorized image.
+    """
+    if output_size is None:
+        return tuple(shape[:2])
+    if isinstance(output_size, int):
+        scale = output_size / max(shape[:2])
+        return max(1, round(shape[0] * scale)), max(1, round(shape[1] * scale))
+    return tuple(output_size)
+
+
+def colorize_batch(images, model='siggraph17', batch_size=8, use_gpu=False, dtype=torch.float32, backend='eager',
+                   inference_size=INFERENCE_SIZE, output_size=None):
+    """
+    Colorize many RGB images, running one forward pass per batch of resized L channels.
+
+    :param images: Sequence of RGB images as numpy arrays, the images may differ in size.
+    :param model: Name of the colorizer ('siggraph17' or 'eccv16') or a colorizer module.
+    :param batch_size: Number of images per forward pass.
+    :param use_gpu: Whether to run the colorizer on the GPU.
+    :param dtype: Floating point type the colorizer runs in.
+    :param backend: Inference backend of the colorizer, see get_colorizer.
+    :param inference_size: (height, width) of the L channel fed to the colorizer.
+    :param output_size: Resolution of the colorized images, see output_shape. The Lab conversions run at this
+        resolution, so a smaller output is cheaper.
+    :return: List of colorized RGB images as float numpy arrays in [0, 1], in the order of the input.
+    """
+    device = 'cuda' if use_gpu else 'cpu'
+    colorizer = get_colorizer(model, device=device, dtype=dtype, backend=backend) if isinstance(model, str) else model
+
+    out_imgs = []
+    for start in range(0, len(images), batch_size):
+        batch = images[start:start + batch_size]
+        if output_size is not None:
+            batch = [resize_img(img, HW=output_shape(img.shape, output_size)) for img in batch]
+        preprocessed = [preprocess_img(img, HW=tuple(inference_size)) for img in batch]
+        tens_l_rs = torch.cat([tens_rs for _, tens_rs in preprocessed], dim=0)
+
+        with torch.inference_mode():
+            out_ab = colorizer(tens_l_rs.to(device=device, dtype=dtype)).float().cpu()
+
+        for (tens_l_orig, _), img_ab in zip(preprocessed, out_ab):
+            out_imgs.append(postprocess_tens(tens_l_orig, img_ab[None]))
+
+    return out_imgs
+
+
+def colorize_image(img, model='siggraph17', use_gpu=False, dtype=torch.float32, backend='eager',
+                   inference_size=INFERENCE_SIZE, output_size=None):
+    """
+    Colorize an RGB image with a shared pretrained colorizer.
+
+    :param img: RGB image as a numpy array.
+    :param model: Model to use for colorization ('siggraph17' or 'eccv16').
+    :param use_gpu: Whether to run the colorizer on the GPU.
+    :param dtype: Floating point type the colorizer runs in.
+    :param backend: Inference backend of the colorizer, see get_colorizer.
+    :param inference_size: (height, width) of the L channel fed to the colorizer.
+    :param output_size: Resolution of the colorized image, see output_shape.
+    :return: The colorized RGB image as a float numpy array in [0, 1].
+    """
+    return colorize_batch([img], model=model, batch_size=1, use_gpu=use_gpu, dtype=dtype, backend=backend,
+                          inference_size=inference_size, output_size=output_size)[0]
+
 
 def create_colorized_pictures(model='eccv16', img_path='../../../resources/hand-pictures/try/IMG20241123170713.jpg',
-                              use_gpu=False, save_prefix='saved'):
-
-    if model == 'eccv16':
-        # Initialize the ECCV16 model
-        colorizer_eccv16 = eccv16(pretrained=True).eval()
-        if use_gpu:
-            colorizer_eccv16.cuda()
-
-        # Load and preprocess the image
-        img = load_img(img_path)
-        (tens_l_orig, tens_l_rs) = preprocess_img(img, HW=(256, 256))
-        if use_gpu:
-            tens_l_rs = tens_l_rs.cuda()
-
-        # Colorize using ECCV16 model
-        img_bw = postprocess_tens(tens_l_orig, torch.cat((0 * tens_l_orig, 0 * tens_l_orig), dim=1))
-        out_img_eccv16 = postprocess_tens(tens_l_orig, colorizer_eccv16(tens_l_rs).cpu())
-
-
-        output_path = f'../../resources/stylized-pictures/eccv16/{save_prefix}_eccv16.png'
-        if not os.path.exists(os.path.dirname(output_path)):
-            os.makedirs(os.path.dirname(output_path))
-        plt.imsave(output_path, out_img_eccv16)
-        # print(f"Saved colorized image at {output_path}")
-
-    else:
-        # Initialize the Siggraph17 model
-        colorizer_siggraph17 = siggraph17(pretrained=True).eval()
-        if use_gpu:
-            colorizer_siggraph17.cuda()
-
-        # Load and preprocess the image
-        img = load_img(img_path)
-        (tens_l_orig, tens_l_rs) = preprocess_img(img, HW=(256, 256))
-        if use_gpu:
-            tens_l_rs = tens_l_rs.cuda()
-
-        # Colorize using Siggraph17 model
-        img_bw = postprocess_tens(tens_l_orig, torch.cat((0 * tens_l_orig, 0 * tens_l_orig), dim=1))
-        out_img_siggraph17 = postprocess_tens(tens_l_orig, colorizer_siggraph17(tens_l_rs).cpu())
-
-        # # Construct the output path (absolute path)
-        output_path = f'../../resources/stylized-pictures/siggraph17/{save_prefix}_siggraph17.png'
-        if not os.path.exists(os.path.dirname(output_path)):
-            os.makedirs(os.path.dirname(output_path))
-        plt.imsave(output_path, out_img_siggraph17)
-        # print(f"Saved colorized image at {output_path}")
+                              use_gpu=False, save_prefix='saved', dtype=torch.float32, inference_size=INFERENCE_SIZE,
+                              output_size=None, backend='eager', calibration_inputs=None):
 
+    # Load and colorize the image
+    img = load_img(img_path)
+    colorizer = get_colorizer(model, device='cuda' if use_gpu else 'cpu', dtype=dtype, backend=backend,
+                              calibration_inputs=calibration_inputs)
+    out_img = colorize_image(img, model=colorizer, use_gpu=use_gpu, dtype=dtype, inference_size=inference_size,
+                             output_size=output_size)
 
+    output_path = f'../../resources/stylized-pictures/{model}/{save_prefix}_{model}.png'
+    if not os.path.exists(os.path.dirname(output_path)):
+        os.makedirs(os.path.dirname(output_path))
+    plt.imsave(output_path, out_img)
+    # print(f"Saved colorized image at {output_path}")
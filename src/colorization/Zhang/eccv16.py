@@ -100,6 +100,6 @@ class ECCVGenerator(BaseColor):
 def eccv16(pretrained=True):
 	model = ECCVGenerator()
 	if(pretrained):
-		import torch.utils.model_zoo as model_zoo
-		model.load_state_dict(model_zoo.load_url('https://colorizers.s3.us-east-2.amazonaws.com/colorization_release_v2-9b330a0b.pth',map_location='cpu',check_hash=True))
+		from .weights import load_pretrained_state_dict
+		model.load_state_dict(load_pretrained_state_dict('eccv16'), assign=True)
 	return model
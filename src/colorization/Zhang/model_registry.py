@@ -0,0 +1,96 @@
+import hashlib
+import os
+import threading
+
+import torch
+
+from .acceleration import CPU_ONLY_BACKENDS, OnnxColorizer, accelerate
+from .eccv16 import eccv16
+from .siggraph17 import siggraph17
+from .weights import WEIGHT_URLS, expected_hash_prefix, get_weights_dir
+
+COLORIZER_FACTORIES = {
+    'eccv16': eccv16,
+    'siggraph17': siggraph17,
+}
+
+# Process-wide colorizers keyed by (model name, device, dtype, backend, calibration fingerprint)
+_colorizers = {}
+_colorizers_lock = threading.Lock()
+
+
+def calibration_fingerprint(calibration_inputs):
+    """
+    :param calibration_inputs: L channel batches calibrating 'int8_static', see acceleration.calibration_batches.
+    :return: SHA-256 of the batches, telling apart colorizers calibrated on different inputs.
+    """
+    digest = hashlib.sha256()
+    for input_l in calibration_inputs:
+        digest.update(input_l.float().cpu().numpy().tobytes())
+    return digest.hexdigest()
+
+
+def get_colorizer(model='siggraph17', device='cpu', dtype=torch.float32, backend='eager', calibration_inputs=None,
+                  calibration_key=None):
+    """
+    Return a pretrained colorizer in eval mode, building and hash-checking it only on first use.
+
+    :param model: Name of the colorizer ('eccv16' or 'siggraph17').
+    :param device: Device the colorizer runs on.
+    :param dtype: Floating point type of the colorizer weights.
+    :param backend: Inference backend, one of acceleration.COLORIZER_BACKENDS. Backends other than 'eager'
+        are derived from the float32 eager colorizer.
+    :param calibration_inputs: L channel batches calibrating 'int8_static', see acceleration.calibration_batches.
+        Random L channels if None. Colorizers calibrated on different inputs are cached separately.
+    :param calibration_key: calibration_fingerprint of the calibration inputs, computed from them if None.
+        Callers resolving the colorizer per image pass it, so that the inputs are not hashed every time.
+    :return: The shared colorizer module.
+    """
+    if model not in COLORIZER_FACTORIES:
+        raise ValueError(f"Unknown colorization model '{model}', expected one of {sorted(COLORIZER_FACTORIES)}.")
+    device = torch.device(device)
+    if backend in CPU_ONLY_BACKENDS and device.type != 'cpu':
+        raise ValueError(f"The '{backend}' colorizer backend only runs on the CPU.")
+
+    if backend != 'int8_static' or calibration_inputs is None:
+        calibration_inputs = calibration_key = None
+    elif calibration_key is None:
+        calibration_key = calibration_fingerprint(calibration_inputs)
+
+    with _colorizers_lock:
+        return _get_colorizer(model, device, dtype, backend, calibration_inputs, calibration_key)
+
+
+def onnx_export_path(model):
+    """
+    :param model: Name of the colorizer ('eccv16' or 'siggraph17').
+    :return: Path of the ONNX export of the pretrained colorizer in the weight store. The name carries the hash
+        prefix of the checkpoint, so an export is only reused for the weights it was made from.
+    """
+    fingerprint = expected_hash_prefix(os.path.basename(WEIGHT_URLS[model]))
+    return os.path.join(get_weights_dir(), 'onnx', f'{model}-{fingerprint}.onnx')
+
+
+def _get_colorizer(model, device, dtype, backend, calibration_inputs=None, calibration_key=None):
+    key = (model, str(device), dtype, backend, calibration_key)
+    if key not in _colorizers:
+        if backend == 'eager':
+            colorizer = COLORIZER_FACTORIES[model](pretrained=True).eval()
+            colorizer.requires_grad_(False)
+            _colorizers[key] = colorizer.to(device=device, dtype=dtype)
+        elif backend == 'onnx' and os.path.exists(onnx_export_path(model)):
+            # Exported by an earlier run or another worker
+            _colorizers[key] = OnnxColorizer(onnx_export_path(model))
+        else:
+            onnx_path = onnx_export_path(model) if backend == 'onnx' else None
+            _colorizers[key] = accelerate(_get_colorizer(model, device, dtype, 'eager'), backend,
+                                          calibration_inputs=calibration_inputs, onnx_path=onnx_path)
+    return _colorizers[key]
+
+
+def clear_colorizers():
+    """
+    Drop all cached colorizers, e.g. to free memory once a run is finished.
+    """
+    with _colorizers_lock:
+        _colorizers.clear()
@@ -151,18 +151,12 @@ class SIGGRAPHGenerator(BaseColor):
         conv10_2 = self.model10(conv10_up)
         out_reg = self.model_out(conv10_2)
 
-        conv9_up = self.model9up(conv8_3) + self.model2short9(conv2_2)
-        conv9_3 = self.model9(conv9_up)
-        conv10_up = self.model10up(conv9_3) + self.model1short10(conv1_2)
-        conv10_2 = self.model10(conv10_up)
-        out_reg = self.model_out(conv10_2)
-
         return self.unnormalize_ab(out_reg)
 
 def siggraph17(pretrained=True):
     model = SIGGRAPHGenerator()
     if(pretrained):
-        import torch.utils.model_zoo as model_zoo
-        model.load_state_dict(model_zoo.load_url('https://colorizers.s3.us-east-2.amazonaws.com/siggraph17-df00044c.pth',map_location='cpu',check_hash=True))
+        from .weights import load_pretrained_state_dict
+        model.load_state_dict(load_pretrained_state_dict('siggraph17'), assign=True)
     return model
 
@@ -6,31 +6,89 @@ import torch
 import torch.nn.functional as F
 from IPython import embed
 
-def load_img(img_path):
+def load_img(img_path, keep_gray=False):
+	# keep_gray returns single channel images as 2-D arrays, which preprocess_img accepts as they are
 	out_np = np.asarray(Image.open(img_path))
-	if(out_np.ndim==2):
+	if(out_np.ndim==2 and not keep_gray):
 		out_np = np.tile(out_np[:,:,None],3)
 	return out_np
 
 def resize_img(img, HW=(256,256), resample=3):
 	return np.asarray(Image.fromarray(img).resize((HW[1],HW[0]), resample=resample))
 
-def preprocess_img(img_rgb_orig, HW=(256,256), resample=3):
+# sRGB (D65) to XYZ, as in skimage.color
+XYZ_FROM_RGB = np.array([[0.412453, 0.357580, 0.180423],
+						 [0.212671, 0.715160, 0.072169],
+						 [0.019334, 0.119193, 0.950227]])
+RGB_FROM_XYZ = np.linalg.inv(XYZ_FROM_RGB).astype(np.float32)
+Y_FROM_RGB = XYZ_FROM_RGB[1].astype(np.float32)
+D65_WHITE = np.array([0.95047, 1., 1.08883], dtype=np.float32)
+
+def srgb_to_linear(arr):
+	return np.where(arr > 0.04045, ((arr + 0.055) / 1.055) ** 2.4, arr / 12.92)
+
+# Linear value of every uint8 sRGB intensity
+LINEAR_FROM_UINT8 = srgb_to_linear(np.arange(256) / 255.).astype(np.float32)
+
+def luminance_to_l(y):
+	# L of CIELAB from the relative luminance Y, same piecewise f as skimage.color.xyz2lab
+	fy = np.where(y > 0.008856, np.cbrt(y), 7.787 * y + 16. / 116.)
+	return (116. * fy - 16.).astype(np.float32)
+
+# L channel of every uint8 gray level
+L_FROM_UINT8_GRAY = luminance_to_l(LINEAR_FROM_UINT8.astype(np.float64))
+
+def rgb2l(img_rgb):
+	"""
+	L channel of CIELAB, as color.rgb2lab(img_rgb)[:,:,0] but in float32 and without computing a and b,
+	which only depend on X and Z. uint8 images are linearized with a lookup table.
+	"""
+	if(img_rgb.ndim==2 and img_rgb.dtype==np.uint8):
+		return L_FROM_UINT8_GRAY[img_rgb]
+	if(img_rgb.dtype==np.uint8):
+		linear = LINEAR_FROM_UINT8[img_rgb]
+	else:
+		linear = srgb_to_linear(img_rgb.astype(np.float32)).astype(np.float32)
+	if(linear.ndim==2):
+		return luminance_to_l(linear)
+	return luminance_to_l(linear[...,:3] @ Y_FROM_RGB)
+
+def lab2rgb_fast(lab):
+	"""
+	float32 version of color.lab2rgb for H x W x 3 arrays.
+	"""
+	lab = lab.astype(np.float32, copy=False)
+	fy = (lab[...,0] + 16.) / 116.
+	fx = fy + lab[...,1] / 500.
+	fz = np.maximum(fy - lab[...,2] / 200., 0)
+	f = np.stack((fx, fy, fz), axis=-1)
+	xyz = np.where(f > 0.2068966, f ** 3, (f - 16. / 116.) / 7.787) * D65_WHITE
+	rgb = xyz @ RGB_FROM_XYZ.T
+	rgb = np.where(rgb > 0.0031308, 1.055 * np.power(np.maximum(rgb, 0.0031308), 1 / 2.4) - 0.055, 12.92 * rgb)
+	return np.clip(rgb, 0, 1)
+
+def preprocess_img(img_rgb_orig, HW=(256,256), resample=3, fast=True):
 	# return original size L and resized L as torch Tensors
+	# img_rgb_orig may be a 2-D gray image, whose L is looked up without building RGB
 	img_rgb_rs = resize_img(img_rgb_orig, HW=HW, resample=resample)
-	
-	img_lab_orig = color.rgb2lab(img_rgb_orig)
-	img_lab_rs = color.rgb2lab(img_rgb_rs)
 
-	img_l_orig = img_lab_orig[:,:,0]
-	img_l_rs = img_lab_rs[:,:,0]
+	if(fast):
+		# Only L is used, computed in float32
+		img_l_orig = rgb2l(img_rgb_orig)
+		img_l_rs = rgb2l(img_rgb_rs)
+	else:
+		if(img_rgb_orig.ndim==2):
+			img_rgb_orig = np.tile(img_rgb_orig[:,:,None],3)
+			img_rgb_rs = np.tile(img_rgb_rs[:,:,None],3)
+		img_l_orig = color.rgb2lab(img_rgb_orig)[:,:,0]
+		img_l_rs = color.rgb2lab(img_rgb_rs)[:,:,0]
 
 	tens_orig_l = torch.Tensor(img_l_orig)[None,None,:,:]
 	tens_rs_l = torch.Tensor(img_l_rs)[None,None,:,:]
 
 	return (tens_orig_l, tens_rs_l)
 
-def postprocess_tens(tens_orig_l, out_ab, mode='bilinear'):
+def postprocess_tens(tens_orig_l, out_ab, mode='bilinear', fast=True):
 	# tens_orig_l 	1 x 1 x H_orig x W_orig
 	# out_ab 		1 x 2 x H x W
 
@@ -44,4 +102,6 @@ def postprocess_tens(tens_orig_l, out_ab, mode='bilinear'):
 		out_ab_orig = out_ab
 
 	out_lab_orig = torch.cat((tens_orig_l, out_ab_orig), dim=1)
+	if(fast):
+		return lab2rgb_fast(out_lab_orig.data.cpu().numpy()[0,...].transpose((1,2,0)))
 	return color.lab2rgb(out_lab_orig.data.cpu().numpy()[0,...].transpose((1,2,0)))
@@ -0,0 +1,121 @@
+import hashlib
+import json
+import os
+import threading
+
+import torch
+
+from src.utils.atomic_write import atomic_write
+
+WEIGHT_URLS = {
+    'eccv16': 'https://colorizers.s3.us-east-2.amazonaws.com/colorization_release_v2-9b330a0b.pth',
+    'siggraph17': 'https://colorizers.s3.us-east-2.amazonaws.com/siggraph17-df00044c.pth',
+}
+
+MANIFEST_NAME = 'manifest.json'
+
+_manifest_lock = threading.Lock()
+
+
+def get_weights_dir():
+    """
+    Directory of the local weight store. Set COLORIZER_WEIGHTS_DIR to use a custom location, otherwise the
+    torch hub checkpoint directory used by model_zoo.load_url is reused.
+    """
+    return os.getenv('COLORIZER_WEIGHTS_DIR', os.path.join(torch.hub.get_dir(), 'checkpoints'))
+
+
+def expected_hash_prefix(file_name):
+    # Same convention as torch.hub: 'name-<sha256 prefix>.pth'
+    return os.path.splitext(file_name)[0].rsplit('-', 1)[-1]
+
+
+def sha256_of_file(path, chunk_size=1 << 20):
+    sha256 = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            sha256.update(chunk)
+    return sha256.hexdigest()
+
+
+def _read_manifest(weights_dir):
+    manifest_path = os.path.join(weights_dir, MANIFEST_NAME)
+    if not os.path.exists(manifest_path):
+        return {}
+    try:
+        with open(manifest_path, 'r') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _record_verified(weights_dir, file_name, digest, stat):
+    # Re-read under the lock so that threads do not drop each other's entries
+    with _manifest_lock:
+        manifest = _read_manifest(weights_dir)
+        manifest[file_name] = {'sha256': digest, 'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+
+        def write(tmp_path):
+            with open(tmp_path, 'w') as f:
+                json.dump(manifest, f, indent=4)
+
+        atomic_write(os.path.join(weights_dir, MANIFEST_NAME), write)
+
+
+def resolve_weights(model_name, weights_dir=None):
+    """
+    Return the path of a verified local checkpoint, downloading it only if it is missing.
+
+    A checkpoint is hashed once; its size and mtime are recorded in the manifest so that later loads of the
+    unchanged file skip hashing.
+
+    :param model_name: Name of the colorizer ('eccv16' or 'siggraph17').
+    :param weights_dir: Directory of the weight store, defaults to get_weights_dir().
+    :return: Path to the checkpoint.
+    """
+    if model_name not in WEIGHT_URLS:
+        raise ValueError(f"No pretrained weights for '{model_name}', expected one of {sorted(WEIGHT_URLS)}.")
+
+    weights_dir = weights_dir or get_weights_dir()
+    url = WEIGHT_URLS[model_name]
+    file_name = os.path.basename(url)
+    path = os.path.join(weights_dir, file_name)
+    hash_prefix = expected_hash_prefix(file_name)
+
+    if not os.path.exists(path):
+        os.makedirs(weights_dir, exist_ok=True)
+        try:
+            torch.hub.download_url_to_file(url, path, hash_prefix=hash_prefix)
+        except Exception as e:
+            raise RuntimeError(f"Weights for '{model_name}' are not in {weights_dir} and could not be downloaded "
+                               f"from {url}. Copy '{file_name}' into that directory to run offline.") from e
+
+    stat = os.stat(path)
+    entry = _read_manifest(weights_dir).get(file_name)
+    if entry and entry['size'] == stat.st_size and entry['mtime_ns'] == stat.st_mtime_ns:
+        return path
+
+    digest = sha256_of_file(path)
+    if not digest.startswith(hash_prefix):
+        raise RuntimeError(f"Checkpoint {path} is corrupted: sha256 {digest} does not match '{hash_prefix}'.")
+    _record_verified(weights_dir, file_name, digest, stat)
+    return path
+
+
+def load_pretrained_state_dict(model_name, weights_dir=None):
+    """
+    Load the state dict of a pretrained colorizer from the local weight store.
+
+    The checkpoint is memory-mapped, so processes loading the same weights share the page cache instead of
+    each holding a private copy.
+
+    :param model_name: Name of the colorizer ('eccv16' or 'siggraph17').
+    :param weights_dir: Directory of the weight store, defaults to get_weights_dir().
+    :return: The state dict.
+    """
+    path = resolve_weights(model_name, weights_dir)
+    try:
+        return torch.load(path, map_location='cpu', mmap=True, weights_only=True)
+    except RuntimeError:
+        # Legacy (non-zip) checkpoints cannot be memory-mapped
+        return torch.load(path, map_location='cpu', weights_only=True)
@@ -0,0 +1,144 @@
+import json
+import os
+
+import numpy as np
+
+from src.evaluation.PCKEngine import NUM_LANDMARKS
+
+# Images whose annotations are excluded from every evaluation.
+EXCLUDED_IMAGE_PREFIXES = ("49_", "10_", "68_", "29_")
+
+
+class GroundTruthStore:
+    """
+    Class holding the ground truth landmarks of a dataset as one array of shape (N_images, 2, 21, 2),
+    indexed as [image, hand, landmark, (x, y)], together with an index from image names to rows.
+    """
+
+    def __init__(self, image_names, landmarks, excluded_prefixes=EXCLUDED_IMAGE_PREFIXES):
+        """
+        Initialize the GroundTruthStore, dropping the images whose name starts with an excluded prefix.
+
+        :param image_names: Names of the annotated images.
+        :param landmarks: Landmarks of the images, of shape (N_images, 2, 21, 2).
+        :param excluded_prefixes: Prefixes of the names of the images to exclude.
+        """
+        self.excluded_prefixes = tuple(excluded_prefixes)
+        landmarks = np.asarray(landmarks, dtype=np.float64).reshape(-1, 2, NUM_LANDMARKS, 2)
+
+        keep = [index for index, image_name in enumerate(image_names)
+                if not image_name.startswith(self.excluded_prefixes)]
+        self.image_names = [image_names[index] for index in keep]
+        self.landmarks = np.ascontiguousarray(landmarks[keep])
+        self.index = {image_name: index for index, image_name in enumerate(self.image_names)}
+
+    def __len__(self):
+        return len(self.image_names)
+
+    def __getitem__(self, image_name):
+        return self.landmarks[self.index[image_name]]
+
+    @classmethod
+    def from_directory(cls, ground_truth_directory, excluded_prefixes=EXCLUDED_IMAGE_PREFIXES, cache_path=None):
+        """
+        Parse every JSON annotation file of a directory.
+
+        :param ground_truth_directory: Directory containing ground truth annotations in JSON files.
+        :param excluded_prefixes: Prefixes of the names of the images to exclude.
+        :param cache_path: Optional .npz file. It is loaded instead of the JSON files when it was built from the
+            same files, with the same names, sizes and modification times, and written after parsing otherwise.
+        :return: The GroundTruthStore.
+        """
+        json_paths = sorted(os.path.join(ground_truth_directory, file_name)
+                            for file_name in os.listdir(ground_truth_directory) if file_name.endswith('.json'))
+        sources = cls.describe_sources(json_paths)
+
+        if cache_path and os.path.exists(cache_path) and cls.cached_sources(cache_path) == sources:
+            store = cls.load(cache_path)
+            if store.excluded_prefixes == tuple(excluded_prefixes):
+                return store
+
+        image_names, landmarks = [], []
+        for json_path in json_paths:
+            with open(json_path, 'r') as f:
+                ground_truth_data = json.load(f)
+
+            for entry in ground_truth_data:
+                image_names.append(entry["image"])
+                landmarks.append([[[point['x'], point['y']] for point in hand] for hand in entry["landmarks"][:2]])
+
+        store = cls(image_names, landmarks, excluded_prefixes)
+        if cache_path:
+            store.save(cache_path, sources)
+        return store
+
+    @staticmethod
+    def describe_sources(json_paths):
+        """
+        :param json_paths: Sorted paths of the annotation files.
+        :return: JSON description of the name, size and modification time of every annotation file, so that
+            added, deleted and modified files all change it.
+        """
+        sources = []
+        for json_path in json_paths:
+            stat = os.stat(json_path)
+            sources.append([os.path.basename(json_path), stat.st_size, stat.st_mtime_ns])
+        return json.dumps(sources)
+
+    @staticmethod
+    def cached_sources(path):
+        """
+        :param path: Path of an .npz file written by save.
+        :return: The description of the annotation files the store was built from, or None if unknown.
+        """
+        try:
+            with np.load(path) as data:
+                return str(data["sources"]) if "sources" in data.files else None
+        except (OSError, ValueError):
+            return None
+
+    @classmethod
+    def load(cls, path):
+        """
+        Load a GroundTruthStore saved with save.
+
+        :param path: Path of the .npz file.
+        :return: The GroundTruthStore.
+        """
+        with np.load(path) as data:
+            return cls(data["image_names"].tolist(), data["landmarks"], data["excluded_prefixes"].tolist())
+
+    def save(self, path, sources=None):
+        """
+        Save the GroundTruthStore as an .npz file.
+
+        :param path: Path of the .npz file.
+        :param sources: Description of the annotation files the store was built from, see describe_sources.
+        """
+        arrays = {"image_names": np.array(self.image_names, dtype=str), "landmarks": self.landmarks,
+                  "excluded_prefixes": np.array(self.excluded_prefixes, dtype=str)}
+        if sources is not None:
+            arrays["sources"] = np.array(sources)
+        np.savez(path, **arrays)
+
+    def rotated_90_counterclockwise(self):
+        """
+        Rotate the normalized landmarks of every image by 90 degrees counter-clockwise, matching
+        cv2.ROTATE_90_COUNTERCLOCKWISE applied to the images.
+
+        :return: A new GroundTruthStore with the rotated landmarks.
+        """
+        rotated = np.stack([self.landmarks[..., 1], 1 - self.landmarks[..., 0]], axis=-1)
+        return GroundTruthStore(self.image_names, rotated, self.excluded_prefixes)
+
+    def existing(self, image_directory):
+        """
+        Keep the images that exist in an image directory.
+
+        :param image_directory: Directory containing the images.
+        :return: A new GroundTruthStore with only the existing images.
+        """
+        keep = [index for index, image_name in enumerate(self.image_names)
+                if os.path.exists(os.path.join(image_directory, image_name))]
+        return GroundTruthStore([self.image_names[index] for index in keep], self.landmarks[keep],
+                                self.excluded_prefixes)
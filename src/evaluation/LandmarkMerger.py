@@ -1,34 +1,65 @@
 import numpy as np
-from mediapipe.framework.formats import landmark_pb2
+
+from src.evaluation.PCKEngine import NUM_LANDMARKS
+
+HANDS = ("Left", "Right")
+
+MERGE_STRATEGIES = ("open_palm", "confidence_weighted", "median")
+
+# Landmarks below this index (wrist and thumb) are merged on x, the others on y
+NUM_THUMB_SIDE_LANDMARKS = 6
+
+# Landmarks that must lie on the far side of the thumb base (landmark 2) for a correct finger order
+PINKY_SIDE_LANDMARKS = slice(10, NUM_LANDMARKS)
 
 
 class LandmarkMerger:
     """
-    A class to merge and process hand landmarks from two pipelines.
+    A class to merge and process hand landmarks from any number of pipelines.
+
+    The hands of every pipeline are held as (hands, 21, 3) float32 arrays of x, y and z, and handedness
+    assignment, finger order checks and per-landmark selection are vectorized over them.
+
+    The hands found for the same side are merged with one of MERGE_STRATEGIES: "open_palm" prefers Open_Palm
+    hands with a correct finger order, "confidence_weighted" averages the hands weighted by their detection
+    confidence and "median" takes the per-landmark median.
     """
 
-    def __init__(self, first_pipeline_results, second_pipeline_results):
+    def __init__(self, *pipeline_results):
         """
-        Initialize the LandmarkMerger with results from two pipelines.
+        Initialize the LandmarkMerger with results from several pipelines.
 
-        :param first_pipeline_results: Results from the first pipeline (MediaPipe).
-        :param second_pipeline_results: Results from the second pipeline (MediaPipe).
+        :param pipeline_results: Results of each pipeline (MediaPipe), in order of preference.
         """
-        self.first_pipeline_landmarks = self.create_landmarks_from_results(first_pipeline_results)
-        self.second_pipeline_landmarks = self.create_landmarks_from_results(second_pipeline_results)
+        self.pipeline_landmarks = [self.create_landmarks_from_results(results) for results in pipeline_results]
         self.final_landmarks = None
 
+    @staticmethod
+    def results_to_arrays(results):
+        """
+        :param results: MediaPipe results containing hand landmarks and gestures.
+        :return: tuple
+            Landmarks of shape (hands, 21, 3) as float32, top gesture names, their scores and the handedness
+            scores used as detection confidences, both of shape (hands,).
+        """
+        landmarks = np.array([[(landmark.x, landmark.y, landmark.z) for landmark in hand]
+                              for hand in results.hand_landmarks], dtype=np.float32).reshape(-1, NUM_LANDMARKS, 3)
+        gestures = [hand_gestures[0].category_name for hand_gestures in results.gestures]
+        scores = np.array([hand_gestures[0].score for hand_gestures in results.gestures], dtype=np.float64)
+        confidences = np.array([handedness[0].score for handedness in results.handedness], dtype=np.float64)
+        return landmarks, gestures, scores, confidences
+
     @staticmethod
     def is_right_hand_one(landmarks):
         """
         Determines if the hand landmarks belong to the right hand.
 
-        :param landmarks: List of landmarks for a hand.
+        :param landmarks: Landmarks of a hand, of shape (21, 3).
         :return: True if the hand is likely the right hand, False otherwise.
         """
         thumb = landmarks[4]
         pinky = landmarks[20]
-        return thumb.x > pinky.x
+        return thumb[0] > pinky[0]
 
     @staticmethod
     def is_right_hand(landmarks_1, landmarks_2):
@@ -36,146 +67,137 @@ class LandmarkMerger:
         Determines if the landmarks_1 belong to the right hand
         based on their relative positions to landmarks_2.
 
-        :param landmarks_1: List of landmarks for the first hand.
-        :param landmarks_2: List of landmarks for the second hand.
+        :param landmarks_1: Landmarks of the first hand, of shape (21, 3).
+        :param landmarks_2: Landmarks of the second hand, of shape (21, 3).
         :return: True if landmarks_1 is the right hand, False otherwise.
         """
-        landmarks_1_x = [landmark.x for landmark in landmarks_1]
-        landmarks_2_x = [landmark.x for landmark in landmarks_2]
-
         # Compare average x-coordinates to decide relative handedness
-        return np.mean(landmarks_1_x) > np.mean(landmarks_2_x)
+        return landmarks_1[:, 0].mean(dtype=np.float64) > landmarks_2[:, 0].mean(dtype=np.float64)
 
     def create_landmarks_from_results(self, results):
         """
         Extracts landmarks, gestures, and scores from the recognition results.
 
         :param results: MediaPipe results containing hand landmarks and gestures.
-        :return: A dictionary with landmarks, gestures, and scores for each hand.
+        :return: A dictionary with the landmarks of shape (hands, 21, 3), the index in HANDS of every hand,
+            whether its gesture is Open_Palm, its gesture score and its detection confidence.
         """
-        landmarks = results.hand_landmarks
-        gestures = results.gestures
-        final_landmarks = {}
+        landmarks, gestures, scores, confidences = self.results_to_arrays(results)
 
         if len(landmarks) == 2:  # If both hands are detected
             # Decide which hand is left or right based on their relative positions
-            if self.is_right_hand(landmarks[0], landmarks[1]):
-                handedness = ['Right', 'Left']
-            else:
-                handedness = ['Left', 'Right']
-
-            for i, hand_landmarks in enumerate(landmarks):
-                hand_gestures = gestures[i]
-
-                final_landmarks[handedness[i]] = {
-                    "landmarks": hand_landmarks,
-                    "gestures": hand_gestures[0].category_name,
-                    "score": hand_gestures[0].score
-                }
+            right_first = self.is_right_hand(landmarks[0], landmarks[1])
+            handedness = np.array([1, 0] if right_first else [0, 1])
         else:  # Single hand detected
-            for i, hand_landmarks in enumerate(landmarks):
-                hand_gestures = gestures[i]
-                handedness = 'Right' if self.is_right_hand_one(hand_landmarks) else 'Left'
-                final_landmarks[handedness] = {
-                    "landmarks": hand_landmarks,
-                    "gestures": hand_gestures[0].category_name,
-                    "score": hand_gestures[0].score
-                }
+            handedness = np.array([1 if self.is_right_hand_one(hand) else 0 for hand in landmarks], dtype=int)
 
-        return final_landmarks
+        return {
+            "landmarks": landmarks,
+            "handedness": handedness,
+            "open_palm": np.array([gesture == 'Open_Palm' for gesture in gestures], dtype=bool),
+            "scores": scores,
+            "confidences": confidences,
+        }
 
-    def merge_landmarks(self):
+    def merge_landmarks(self, strategy="open_palm"):
         """
-        Merges landmarks from the two pipelines to generate final landmarks.
+        Merges landmarks from all pipelines to generate final landmarks, Left hand first.
+
+        :param strategy: One of MERGE_STRATEGIES.
         """
-        landmarks_gestures_score = {"Left": [], "Right": []}
+        if strategy not in MERGE_STRATEGIES:
+            raise ValueError(f"Unknown merge strategy '{strategy}', expected one of {MERGE_STRATEGIES}.")
 
-        # Add landmarks from the first pipeline
-        for hand in ["Left", "Right"]:
-            if hand in self.first_pipeline_landmarks:
-                landmarks_gestures_score[hand].append(self.first_pipeline_landmarks[hand])
+        def concatenate(field, empty):
+            return np.concatenate([pipeline[field] for pipeline in self.pipeline_landmarks] or [empty])
 
-        # Add landmarks from the second pipeline
-        for hand in ["Left", "Right"]:
-            if hand in self.second_pipeline_landmarks:
-                landmarks_gestures_score[hand].append(self.second_pipeline_landmarks[hand])
+        landmarks = concatenate("landmarks", np.empty((0, NUM_LANDMARKS, 3), np.float32))
+        handedness = concatenate("handedness", np.empty(0, int))
+        open_palm = concatenate("open_palm", np.empty(0, bool))
+        scores = concatenate("scores", np.empty(0))
+        confidences = concatenate("confidences", np.empty(0))
 
         self.final_landmarks = []
-        for hand in ["Left", "Right"]:
-            self.process_hand_landmarks(landmarks_gestures_score[hand], hand)
+        for hand_index, hand in enumerate(HANDS):
+            selected = handedness == hand_index
+            if not selected.any():
+                continue
+
+            if strategy == "open_palm":
+                merged_landmarks = self.process_hand_landmarks(landmarks[selected], open_palm[selected],
+                                                               scores[selected], hand)
+            elif strategy == "confidence_weighted":
+                merged_landmarks = self.merge_confidence_weighted(landmarks[selected], confidences[selected])
+            else:
+                merged_landmarks = np.median(landmarks[selected], axis=0).astype(np.float32)
+            self.final_landmarks.append(merged_landmarks)
 
-    def process_hand_landmarks(self, landmarks_list, hand):
+    def process_hand_landmarks(self, landmarks, open_palm, scores, hand):
         """
         Processes landmarks for a specific hand by merging or selecting the best landmarks.
 
-        :param landmarks_list: List of landmarks and their corresponding metadata.
+        :param landmarks: Landmarks of the hand in every pipeline that found it, of shape (K, 21, 3).
+        :param open_palm: Whether the gesture of each of them is Open_Palm, of shape (K,).
+        :param scores: Gesture scores of shape (K,).
+        :param hand: "Left" or "Right".
+        :return: Landmarks of shape (21, 3), or None if no pipeline found the hand.
         """
-        if not landmarks_list:
-            return
+        if len(landmarks) == 0:
+            return None
 
-        open_palm_landmarks = [l for l in landmarks_list if l['gestures'] == 'Open_Palm']
+        open_palm_landmarks = landmarks[open_palm]
 
         if len(open_palm_landmarks) > 1:
-            merged_landmarks = self.merge_open_palm_landmarks(open_palm_landmarks, hand)
-            self.final_landmarks.append(merged_landmarks)
+            return self.merge_open_palm_landmarks(open_palm_landmarks, hand)
 
         elif len(open_palm_landmarks) == 1:
-            self.final_landmarks.append(open_palm_landmarks[0]['landmarks'])
+            return open_palm_landmarks[0]
 
         else:
-            lowest_score_landmark = min(landmarks_list, key=lambda l: l['score'])
-            self.final_landmarks.append(lowest_score_landmark['landmarks'])
+            return landmarks[np.argmin(scores)]
 
     @staticmethod
-    def merge_open_palm_landmarks(pipelines, handedness):
+    def merge_confidence_weighted(landmarks, confidences):
         """
-        Merges multiple open palm landmarks for a specific hand.
+        Averages the landmarks of a hand found by several pipelines, weighted by their detection confidence.
 
-        :param landmarks_list: List of open palm landmarks.
-        :return: Merged landmarks for the hand.
+        :param landmarks: Landmarks of shape (K, 21, 3).
+        :param confidences: Detection confidences of shape (K,).
+        :return: Merged landmarks of shape (21, 3).
         """
+        weights = np.clip(confidences, 0, None)
+        if weights.sum() <= 0:
+            weights = np.ones_like(weights)
+        return np.tensordot(weights / weights.sum(), landmarks, axes=1).astype(np.float32)
 
-        def is_fingers_correct_order(landmarks):
-            # Extract x-coordinates for all landmarks
-            x_coords = [landmarks[i].x for i in range(len(landmarks))]
-
-            if handedness == "Right":
-                # Right hand: all pinky points (6 to 20) should be to the left of the thumb (2, 3, 4)
-                return all(x_coords[pinky] < x_coords[2] for pinky in range(10, 21))
-            else:  # Left hand
-                # Left hand: all pinky points (6 to 20) should be to the right of the thumb (2, 3, 4)
-                return all(x_coords[pinky] > x_coords[2] for pinky in range(10, 21))
-
-        def merge_logic(points, index):
-            if index < 6:  # For the first 6 landmarks
-                if handedness == "Left":
-                    return min(points, key=lambda p: p.x)  # Leftmost for left hand
-                else:
-                    return max(points, key=lambda p: p.x)  # Rightmost for right hand
-            else:  # For the remaining landmarks
-                return min(points, key=lambda p: p.y)  # Lowest y
-
-        correct_pipelines = [pipeline for pipeline in pipelines if is_fingers_correct_order(pipeline['landmarks'])]
-
-        # If at least one correct pipeline is found
-        if correct_pipelines:
-            merged_landmarks = []
-            num_landmarks = len(correct_pipelines[0]['landmarks'])
-
-            for i in range(num_landmarks):
-                # Extract corresponding landmarks from correct pipelines
-                points = [pipeline['landmarks'][i] for pipeline in correct_pipelines]
-                # Apply merging logic
-                merged_landmarks.append(merge_logic(points, i))
-
-            return merged_landmarks
-
-        # No correct pipeline found, fall back to merging all pipelines
-        merged_landmarks = []
-        num_landmarks = len(pipelines[0]['landmarks'])
-
-        for i in range(num_landmarks):
-            points = [pipeline['landmarks'][i] for pipeline in pipelines]
-            merged_landmarks.append(merge_logic(points, i))
+    @staticmethod
+    def merge_open_palm_landmarks(landmarks, handedness):
+        """
+        Merges multiple open palm landmarks for a specific hand.
 
-        return merged_landmarks
+        :param landmarks: Open palm landmarks of shape (K, 21, 3).
+        :param handedness: "Left" or "Right".
+        :return: Merged landmarks of shape (21, 3).
+        """
+        x_coords = landmarks[:, :, 0]
+        thumb_x = x_coords[:, 2:3]
+        if handedness == "Right":
+            # Right hand: all pinky side points should be to the left of the thumb
+            correct_order = (x_coords[:, PINKY_SIDE_LANDMARKS] < thumb_x).all(axis=1)
+        else:  # Left hand
+            # Left hand: all pinky side points should be to the right of the thumb
+            correct_order = (x_coords[:, PINKY_SIDE_LANDMARKS] > thumb_x).all(axis=1)
+
+        # Merge the pipelines with a correct finger order, or all of them if there are none
+        if correct_order.any():
+            landmarks = landmarks[correct_order]
+
+        choice = np.empty(NUM_LANDMARKS, dtype=int)
+        thumb_side_x = landmarks[:, :NUM_THUMB_SIDE_LANDMARKS, 0]
+        # Leftmost for left hand, rightmost for right hand
+        choice[:NUM_THUMB_SIDE_LANDMARKS] = (thumb_side_x.argmin(axis=0) if handedness == "Left"
+                                             else thumb_side_x.argmax(axis=0))
+        # Lowest y for the remaining landmarks
+        choice[NUM_THUMB_SIDE_LANDMARKS:] = landmarks[:, NUM_THUMB_SIDE_LANDMARKS:, 1].argmin(axis=0)
+
+        return landmarks[choice, np.arange(NUM_LANDMARKS)]
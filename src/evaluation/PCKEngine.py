@@ -0,0 +1,144 @@
+import numpy as np
+
+NUM_LANDMARKS = 21
+
+# np.trapz was renamed to np.trapezoid in numpy 2.0 and later removed
+_trapezoid = getattr(np, "trapezoid", None) or np.trapz
+
+
+class PCKEngine:
+    """
+    Class to calculate the Percentage of Correct Keypoints (PCK) of a whole dataset with array operations.
+
+    Landmarks are stored as arrays of shape (N_images, 2, 21, 2), indexed as [image, hand, landmark, (x, y)].
+    Missing predicted hands are filled with NaN and always come after the detected ones.
+    """
+
+    def __init__(self, ground_truth, predictions):
+        """
+        Initialize the PCKEngine with the landmarks of a dataset.
+
+        :param ground_truth: np.ndarray of shape (N_images, 2, 21, 2) with the ground truth landmarks.
+        :param predictions: np.ndarray of shape (N_images, 2, 21, 2) with the predicted landmarks.
+        """
+        self.ground_truth = np.asarray(ground_truth, dtype=np.float64).reshape(-1, 2, NUM_LANDMARKS, 2)
+        self.predictions = np.asarray(predictions, dtype=np.float64).reshape(-1, 2, NUM_LANDMARKS, 2)
+
+        self.hand_lengths = self.calculate_hand_lengths(self.ground_truth)
+        # Distance of every predicted landmark to the same landmark of every ground truth hand,
+        # indexed as [image, ground truth hand, predicted hand, landmark]
+        self.distances = np.sqrt(((self.ground_truth[:, :, None] - self.predictions[:, None]) ** 2).sum(axis=-1))
+        # Like PCKCalculator.calculate_pck, only hands after a detected first hand count
+        detected = ~np.isnan(self.predictions).any(axis=(2, 3))
+        self.num_predicted_hands = np.where(detected[:, 0], detected.sum(axis=1), 0)
+
+    @staticmethod
+    def calculate_hand_lengths(ground_truth):
+        """
+        Calculate the distance between the wrist and the top of the middle finger of every ground truth hand.
+
+        :param ground_truth: np.ndarray of shape (N_images, 2, 21, 2).
+        :return: np.ndarray of shape (N_images, 2).
+        """
+        return np.sqrt(((ground_truth[:, :, 0] - ground_truth[:, :, 12]) ** 2).sum(axis=-1))
+
+    def calculate_pck(self, thresholds):
+        """
+        Calculate the PCK of every hand in every image for every threshold. A single predicted hand is assigned
+        to the ground truth hand it scores higher on, two predicted hands to the ground truth hands in the order
+        with the higher total score.
+
+        :param thresholds: A distance threshold factor or a sequence of them.
+        :return: np.ndarray of shape (N_thresholds, N_images, 2), indexed as [threshold, image, (Left, Right)].
+        """
+        thresholds = np.atleast_1d(np.asarray(thresholds, dtype=np.float64))
+        acceptable_distances = self.hand_lengths[None] * thresholds[:, None, None]
+
+        # Comparisons with NaN (missing hands) are False, so missing hands score 0
+        correct = (self.distances[None] <= acceptable_distances[..., None, None]).mean(axis=-1)
+        left_first, right_first = correct[..., 0, 0], correct[..., 1, 0]
+        left_second, right_second = correct[..., 0, 1], correct[..., 1, 1]
+
+        first_is_left = left_first > right_first
+        one_hand_left = np.where(first_is_left, left_first, 0.0)
+        one_hand_right = np.where(first_is_left, 0.0, right_first)
+
+        first_left_second_right = left_first + right_second > right_first + left_second
+        two_hands_left = np.where(first_left_second_right, left_first, left_second)
+        two_hands_right = np.where(first_left_second_right, right_second, right_first)
+
+        conditions = [self.num_predicted_hands[None] == 0, self.num_predicted_hands[None] == 1]
+        left = np.select(conditions, [0.0, one_hand_left], two_hands_left)
+        right = np.select(conditions, [0.0, one_hand_right], two_hands_right)
+
+        return np.stack([left, right], axis=-1)
+
+    def calculate_total_pck(self, threshold):
+        """
+        Calculate the PCK of every hand for one threshold, in the structure used by
+        PCKCalculator.calculate_final_pck.
+
+        :param threshold: The distance threshold factor.
+        :return: dict
+            Lists of the PCK of the "Left" and "Right" hand of every image.
+        """
+        pck = self.calculate_pck(threshold)[0]
+        return {"Left": pck[:, 0].tolist(), "Right": pck[:, 1].tolist()}
+
+    def calculate_final_pck(self, thresholds):
+        """
+        Calculate the final PCK of the dataset, the average over all hands of all images, for every threshold.
+
+        :param thresholds: A distance threshold factor or a sequence of them.
+        :return: np.ndarray of shape (N_thresholds,).
+        """
+        pck = self.calculate_pck(thresholds)
+        if pck.shape[1] == 0:
+            return np.zeros(pck.shape[0])
+        return pck.mean(axis=(1, 2))
+
+    def calculate_auc(self, thresholds):
+        """
+        Calculate the area under the PCK curve, normalized by the threshold range so that it lies in [0, 1].
+
+        :param thresholds: Sorted distance threshold factors at which the curve is sampled.
+        :return: float
+            The normalized area under the curve.
+        """
+        thresholds = np.asarray(thresholds, dtype=np.float64)
+        pck_curve = self.calculate_final_pck(thresholds)
+
+        threshold_range = thresholds[-1] - thresholds[0]
+        if threshold_range <= 0:
+            return float(pck_curve[0])
+        return float(_trapezoid(pck_curve, thresholds) / threshold_range)
+
+    @staticmethod
+    def ground_truth_to_array(ground_truth_hands):
+        """
+        Convert the JSON ground truth landmarks of an image to an array.
+
+        :param ground_truth_hands: A list containing list of {'x', 'y'} landmarks for each hand in the image.
+        :return: np.ndarray of shape (2, 21, 2).
+        """
+        return np.array([[[landmark['x'], landmark['y']] for landmark in hand] for hand in ground_truth_hands[:2]],
+                        dtype=np.float64)
+
+    @staticmethod
+    def predictions_to_array(predicted_hands):
+        """
+        Convert the predicted landmarks of an image to an array, filling missing hands with NaN.
+
+        :param predicted_hands: A list of hands, each a list of landmarks with x and y attributes or an array
+            whose first two columns are x and y.
+        :return: np.ndarray of shape (2, 21, 2).
+        """
+        array = np.full((2, NUM_LANDMARKS, 2), np.nan)
+        for hand_index, hand in enumerate(list(predicted_hands or [])[:2]):
+            if len(hand) == 0:
+                break
+            if isinstance(hand, np.ndarray):
+                array[hand_index] = hand[:NUM_LANDMARKS, :2]
+            else:
+                array[hand_index] = [[landmark.x, landmark.y] for landmark in hand[:NUM_LANDMARKS]]
+        return array
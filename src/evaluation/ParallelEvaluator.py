@@ -0,0 +1,213 @@
+import multiprocessing
+import os
+
+import cv2
+import numpy as np
+import torch
+
+from src.colorization.Zhang import COLORIZER_FACTORIES
+from src.evaluation.PCKEngine import NUM_LANDMARKS, PCKEngine
+from src.evaluation.recognizer import Recognizer
+from src.pipelines.FrameExecutor import FrameExecutor
+from src.pipelines.PipelineManager import PipelineManager
+
+# State of the current worker process, set up once by _init_worker, with the pipelines added on first use
+_worker = {}
+
+# Pipelines fused by default, the first and second pipeline of the thesis
+FUSION_PIPELINES = ("siggraph17", "clahe")
+
+
+def _init_worker(model_path, base_output_path, save_artifacts, stage_cache_directory, recognition_cache,
+                 pipeline_options, fusion_options, num_threads):
+    if num_threads:
+        # Keep workers from oversubscribing the cores with their own thread pools
+        torch.set_num_threads(num_threads)
+        cv2.setNumThreads(num_threads)
+
+    _worker["args"] = (model_path, base_output_path, save_artifacts, stage_cache_directory, recognition_cache,
+                       pipeline_options, fusion_options)
+    _worker["recognizer"] = Recognizer.shared(model_path)
+
+
+def _frame_executor():
+    # The bounds only need the recognizer, so the colorizers and pipeline recognizers are built on first use
+    if "frame_executor" in _worker:
+        return _worker["frame_executor"]
+
+    (model_path, base_output_path, save_artifacts, stage_cache_directory, recognition_cache, pipeline_options,
+     fusion_options) = _worker["args"]
+    pipelines = fusion_options.get("pipelines", FUSION_PIPELINES)
+    pipeline_manager = PipelineManager(base_output_path, save_artifacts=save_artifacts,
+                                       stage_cache_directory=stage_cache_directory, **pipeline_options)
+    pipeline_manager.load_colorizers([pipeline for pipeline in pipelines if pipeline in COLORIZER_FACTORIES])
+
+    _worker["pipeline_manager"] = pipeline_manager
+    # The pipelines run on threads of their own, each with a recognizer that no other thread uses
+    cache_directory = os.getenv("RECOGNITION_CACHE_DIR") if recognition_cache else None
+    _worker["frame_executor"] = FrameExecutor(pipeline_manager,
+                                              [Recognizer(model_path, cache_directory) for _ in pipelines],
+                                              **{**fusion_options, "pipelines": pipelines})
+    return _worker["frame_executor"]
+
+
+def close_worker():
+    """
+    Release the FrameExecutor of the in-process worker state, with the recognizers of its pipelines.
+    """
+    if "frame_executor" in _worker:
+        _worker["frame_executor"].close()
+    _worker.clear()
+
+
+def _recognize_image(image_path):
+    results = _worker["recognizer"].recognize_landmarks_gestures(image_path)
+    return PCKEngine.predictions_to_array(results.hand_landmarks)
+
+
+def _run_pipelines(task):
+    image_name, image_path, image_rotation = task
+    frame_executor = _frame_executor()
+    pipeline_manager = _worker["pipeline_manager"]
+
+    image = cv2.imread(image_path)
+    if image_rotation is not None:
+        image = cv2.rotate(image, image_rotation)
+        if pipeline_manager.save_artifacts:
+            pipeline_manager.save_artifact(image, f"rotated/{image_name}_rotated.png")
+
+    pipeline_results, final_landmarks = frame_executor.process_frame(image, image_name)
+
+    # Skipped pipelines found no hands
+    predictions = {pipeline: PCKEngine.predictions_to_array(results.hand_landmarks if results else None)
+                   for pipeline, results in pipeline_results.items()}
+    predictions["final"] = PCKEngine.predictions_to_array(final_landmarks)
+    # Whether every pipeline ran, i.e. the cheap pipelines of an early exit policy did not suffice
+    predictions["escalated"] = all(results is not None for results in pipeline_results.values())
+    return predictions
+
+
+class ParallelEvaluator:
+    """
+    Class to recognize the images of an evaluation dataset on a pool of worker processes.
+
+    Every worker holds its own warm Recognizer and colorizer. The pool is started on first use and kept until
+    close, so the workers stay warm across datasets. Results are returned in the order of the ground truth
+    entries, whatever the number of processes.
+    """
+
+    def __init__(self, processes=1, model_path=None, base_output_path="../resources/stylized-pictures",
+                 save_artifacts=False, stage_cache_directory=None, colorizer_backend='eager', pipeline_options=None,
+                 fusion_options=None, recognition_cache=True):
+        """
+        Initialize the ParallelEvaluator.
+
+        :param processes: Number of worker processes, defaults to one per CPU core. With 1 everything runs
+            in the current process.
+        :param model_path: The path to the gesture recognizer model, defaults to the MODEL_PATH environment variable.
+        :param base_output_path: Base path of the PipelineManager of each worker.
+        :param save_artifacts: Whether the workers write the output of every pipeline stage.
+        :param stage_cache_directory: Directory of the StageCache shared by the workers, or None.
+        :param colorizer_backend: Inference backend of the colorizer of each worker.
+        :param pipeline_options: Further keyword arguments of the PipelineManager of each worker, e.g. the
+            colorization sizes.
+        :param fusion_options: Keyword arguments of the FrameExecutor of each worker: the "pipelines" to fuse,
+            the "merge_strategy" and the "early_exit" policy.
+        :param recognition_cache: Whether the pipeline recognizers of the workers cache their results in the
+            RECOGNITION_CACHE_DIR environment variable directory, e.g. False for timing runs.
+        """
+        self.processes = processes or os.cpu_count()
+        self.model_path = model_path or os.getenv("MODEL_PATH")
+        self.base_output_path = base_output_path
+        self.save_artifacts = save_artifacts
+        self.stage_cache_directory = stage_cache_directory
+        self.recognition_cache = recognition_cache
+        self.pipeline_options = {"colorizer_backend": colorizer_backend, **(pipeline_options or {})}
+        self.fusion_options = fusion_options or {}
+        # Per image of the last collect_pipeline_landmarks, whether every pipeline ran
+        self.escalations = None
+        self._pool = None
+
+    def close(self):
+        """
+        Stop the worker processes.
+        """
+        if self._pool is not None:
+            self._pool.close()
+            self._pool.join()
+            self._pool = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def map(self, function, tasks):
+        """
+        Apply a worker function to every task.
+
+        :param function: Module level function run in the workers.
+        :param tasks: List of picklable tasks.
+        :return: List of results, in the order of the tasks.
+        """
+        if self.processes == 1:
+            worker_args = (self.model_path, self.base_output_path, self.save_artifacts,
+                           self.stage_cache_directory, self.recognition_cache, self.pipeline_options,
+                           self.fusion_options)
+            # Evaluators with other settings in the same process need a fresh worker state
+            if _worker.get("args") != worker_args:
+                close_worker()
+                _init_worker(*worker_args, None)
+            return [function(task) for task in tasks]
+
+        if self._pool is None:
+            num_threads = max(1, (os.cpu_count() or 1) // self.processes)
+            # Spawned workers do not inherit MediaPipe graphs or torch thread pools from the parent
+            context = multiprocessing.get_context('spawn')
+            self._pool = context.Pool(self.processes, initializer=_init_worker,
+                                      initargs=(self.model_path, self.base_output_path, self.save_artifacts,
+                                                self.stage_cache_directory, self.recognition_cache,
+                                                self.pipeline_options, self.fusion_options, num_threads))
+        chunksize = max(1, len(tasks) // (self.processes * 4))
+        return self._pool.map(function, tasks, chunksize=chunksize)
+
+    def collect_bound_landmarks(self, image_directory, ground_truth):
+        """
+        Recognize the unprocessed images of a dataset, as for the upper and lower bounds.
+
+        :param image_directory: Directory containing the images.
+        :param ground_truth: GroundTruthStore of the dataset.
+        :return: tuple
+            Ground truth and predicted landmarks, both np.ndarray of shape (N_images, 2, 21, 2).
+        """
+        ground_truth = ground_truth.existing(image_directory)
+        predictions = self.map(_recognize_image, [os.path.join(image_directory, image_name)
+                                                  for image_name in ground_truth.image_names])
+
+        return ground_truth.landmarks, np.array(predictions).reshape(-1, 2, NUM_LANDMARKS, 2)
+
+    def collect_pipeline_landmarks(self, image_directory, ground_truth, image_rotation=None):
+        """
+        Run the fused pipelines and the landmark merger on the images of a dataset.
+
+        :param image_directory: Directory containing the images.
+        :param ground_truth: GroundTruthStore of the dataset, with landmarks matching the rotated images.
+        :param image_rotation: cv2 rotation code applied to every image before the pipelines, or None.
+        :return: tuple
+            Ground truth landmarks and a dictionary with the predicted landmarks of the "final" results and of
+            every pipeline by name, the first two pipelines also as "first" and "second", all np.ndarray of
+            shape (N_images, 2, 21, 2).
+        """
+        ground_truth = ground_truth.existing(image_directory)
+        results = self.map(_run_pipelines, [(image_name, os.path.join(image_directory, image_name), image_rotation)
+                                            for image_name in ground_truth.image_names])
+
+        pipelines = self.fusion_options.get("pipelines", FUSION_PIPELINES)
+        shape = (-1, 2, NUM_LANDMARKS, 2)
+        predictions = {name: np.array([result[name] for result in results]).reshape(shape)
+                       for name in ["final", *pipelines]}
+        for alias, pipeline in zip(["first", "second"], pipelines):
+            predictions[alias] = predictions[pipeline]
+        self.escalations = np.array([result["escalated"] for result in results], dtype=bool)
+        return ground_truth.landmarks, predictions
@@ -0,0 +1,172 @@
+import hashlib
+import io
+import json
+import os
+import threading
+
+import numpy as np
+from mediapipe.tasks.python import vision
+from mediapipe.tasks.python.components.containers import category as category_module
+from mediapipe.tasks.python.components.containers import landmark as landmark_module
+
+from src.utils.atomic_write import atomic_write
+
+
+class RecognitionCache:
+    """
+    On-disk cache of gesture recognition results, keyed by the content of the image, the model asset and the
+    recognizer options. Entries are evicted least recently used first once the cache exceeds its size limit.
+    """
+
+    def __init__(self, cache_directory, model_path, options, max_size_bytes=512 * 1024 * 1024):
+        """
+        Initialize the RecognitionCache.
+
+        :param cache_directory: Directory in which the entries are stored.
+        :param model_path: The path to the model file, whose content is part of every key.
+        :param options: JSON serializable recognizer options, part of every key.
+        :param max_size_bytes: Size of the cache above which the least recently used entries are evicted.
+        """
+        self.cache_directory = cache_directory
+        self.max_size_bytes = max_size_bytes
+        os.makedirs(cache_directory, exist_ok=True)
+
+        with open(model_path, 'rb') as f:
+            model_hash = hashlib.sha256(f.read()).hexdigest()
+        self.key_prefix = f"{model_hash}:{json.dumps(options, sort_keys=True)}".encode()
+
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._size = sum(entry.stat().st_size for entry in os.scandir(cache_directory)
+                         if entry.name.endswith('.npz'))
+
+    def key_for_bytes(self, image_bytes):
+        """
+        :param image_bytes: Encoded image file content.
+        :return: The cache key of the image.
+        """
+        return hashlib.sha256(self.key_prefix + b"file:" + image_bytes).hexdigest()
+
+    def key_for_array(self, image):
+        """
+        :param image: Image array.
+        :return: The cache key of the image.
+        """
+        image = np.ascontiguousarray(image)
+        header = f"array:{image.dtype.str}:{image.shape}:".encode()
+        return hashlib.sha256(self.key_prefix + header + image.tobytes()).hexdigest()
+
+    def _entry_path(self, key):
+        return os.path.join(self.cache_directory, f"{key}.npz")
+
+    def get(self, key):
+        """
+        Look up a recognition result.
+
+        :param key: The cache key of the image.
+        :return: The cached GestureRecognizerResult, or None if the image was not seen before.
+        """
+        path = self._entry_path(key)
+        try:
+            with open(path, 'rb') as f:
+                data = np.load(io.BytesIO(f.read()))
+            # Mark the entry as recently used
+            os.utime(path)
+        except (OSError, ValueError):
+            with self._lock:
+                self.misses += 1
+            return None
+
+        with self._lock:
+            self.hits += 1
+        return self.decode(data)
+
+    def put(self, key, result):
+        """
+        Store a recognition result and evict old entries if the cache grew too large.
+
+        :param key: The cache key of the image.
+        :param result: GestureRecognizerResult to store.
+        """
+        buffer = io.BytesIO()
+        np.savez_compressed(buffer, **self.encode(result))
+
+        path = self._entry_path(key)
+
+        def write(tmp_path):
+            with open(tmp_path, 'wb') as f:
+                f.write(buffer.getvalue())
+
+        atomic_write(path, write)
+
+        with self._lock:
+            self._size += buffer.tell()
+            if self._size > self.max_size_bytes:
+                self.evict()
+
+    def evict(self):
+        """
+        Delete the least recently used entries until the cache is below its size limit.
+        """
+        entries = [entry for entry in os.scandir(self.cache_directory) if entry.name.endswith('.npz')]
+        entries.sort(key=lambda entry: entry.stat().st_mtime)
+        self._size = sum(entry.stat().st_size for entry in entries)
+
+        for entry in entries:
+            if self._size <= self.max_size_bytes:
+                break
+            try:
+                size = entry.stat().st_size
+                os.remove(entry.path)
+                self._size -= size
+            except OSError:
+                # Already evicted by another worker
+                pass
+
+    @staticmethod
+    def encode(result):
+        """
+        Convert a GestureRecognizerResult to compact arrays.
+
+        :param result: GestureRecognizerResult.
+        :return: Dictionary of arrays.
+        """
+        def landmarks_array(hands):
+            return np.array([[[landmark.x, landmark.y, landmark.z] for landmark in hand] for hand in hands],
+                            dtype=np.float32).reshape(len(hands), -1, 3)
+
+        def categories(hands):
+            return [[[category.index, category.score, category.display_name, category.category_name]
+                     for category in hand] for hand in hands]
+
+        return {
+            "hand_landmarks": landmarks_array(result.hand_landmarks),
+            "hand_world_landmarks": landmarks_array(result.hand_world_landmarks),
+            "categories": np.array(json.dumps({"handedness": categories(result.handedness),
+                                               "gestures": categories(result.gestures)})),
+        }
+
+    @staticmethod
+    def decode(data):
+        """
+        Convert arrays created by encode back to a GestureRecognizerResult.
+
+        :param data: Dictionary of arrays.
+        :return: GestureRecognizerResult.
+        """
+        def landmarks(array, landmark_class):
+            return [[landmark_class(x=float(x), y=float(y), z=float(z)) for x, y, z in hand] for hand in array]
+
+        def categories(hands):
+            return [[category_module.Category(index=index, score=score, display_name=display_name,
+                                              category_name=category_name)
+                     for index, score, display_name, category_name in hand] for hand in hands]
+
+        category_data = json.loads(str(data["categories"]))
+        return vision.GestureRecognizerResult(
+            gestures=categories(category_data["gestures"]),
+            handedness=categories(category_data["handedness"]),
+            hand_landmarks=landmarks(data["hand_landmarks"], landmark_module.NormalizedLandmark),
+            hand_world_landmarks=landmarks(data["hand_world_landmarks"], landmark_module.Landmark),
+        )
@@ -1,22 +1,102 @@
+import os
+import threading
+
 from mediapipe.tasks import python
 from mediapipe.tasks.python import vision
 import mediapipe as mp
+import numpy as np
+import cv2
+
+from src.evaluation.RecognitionCache import RecognitionCache
+
+# Recognizers shared by everything running in the same thread of the same process
+_shared_recognizers = threading.local()
 
 class Recognizer:
 
-    def __init__(self, model_path):
+    def __init__(self, model_path, cache_directory=None, running_mode=vision.RunningMode.IMAGE,
+                 result_callback=None):
         """
         Initialize the Recognizer object with the path to the model.
 
         :param model_path (str): The path to the model file.
+        :param cache_directory (str): Directory of the on-disk RecognitionCache, results are not cached if None.
+            Only used in IMAGE running mode, since video results depend on the previous frames.
+        :param running_mode (vision.RunningMode): IMAGE for stills, VIDEO or LIVE_STREAM for frame sequences.
+        :param result_callback: Function called with (result, image, timestamp_ms) in LIVE_STREAM mode.
         """
+        self.model_path = model_path
+        self.running_mode = running_mode
+        num_hands = 2
+        score_threshold = 0
+
         base_options = python.BaseOptions(model_asset_path=model_path)
         options = vision.GestureRecognizerOptions(base_options=base_options,
-                                                  num_hands=2)
+                                                  running_mode=running_mode,
+                                                  num_hands=num_hands,
+                                                  result_callback=result_callback)
 
-        options.canned_gesture_classifier_options.score_threshold = 0
+        options.canned_gesture_classifier_options.score_threshold = score_threshold
         self.recognizer = vision.GestureRecognizer.create_from_options(options)
 
+        self.cache = None
+        if cache_directory and running_mode == vision.RunningMode.IMAGE:
+            self.cache = RecognitionCache(cache_directory, model_path,
+                                          {"num_hands": num_hands, "score_threshold": score_threshold})
+
+    @classmethod
+    def shared(cls, model_path=None, cache_directory=None):
+        """
+        Return the recognizer shared by the current thread of the current process, creating it on first use.
+        MediaPipe graphs are not safe to share across threads or forked processes, so each gets its own.
+
+        :param model_path (str): The path to the model file, defaults to the MODEL_PATH environment variable.
+        :param cache_directory (str): Directory of the RecognitionCache, defaults to the RECOGNITION_CACHE_DIR
+            environment variable. Results are not cached if neither is set.
+        :return: The shared Recognizer.
+        """
+        model_path = model_path or os.getenv("MODEL_PATH")
+        cache_directory = cache_directory or os.getenv("RECOGNITION_CACHE_DIR")
+        if getattr(_shared_recognizers, "pid", None) != os.getpid():
+            # Recognizers inherited through fork belong to the parent process
+            _shared_recognizers.pid = os.getpid()
+            _shared_recognizers.recognizers = {}
+
+        recognizers = _shared_recognizers.recognizers
+        key = (model_path, cache_directory)
+        if key not in recognizers or recognizers[key].closed:
+            recognizers[key] = cls(model_path, cache_directory)
+        return recognizers[key]
+
+    @staticmethod
+    def close_shared():
+        """
+        Close the recognizers shared by the current thread of the current process.
+        """
+        if getattr(_shared_recognizers, "pid", None) != os.getpid():
+            return
+        for recognizer in _shared_recognizers.recognizers.values():
+            recognizer.close()
+        _shared_recognizers.recognizers = {}
+
+    @property
+    def closed(self):
+        return self.recognizer is None
+
+    def close(self):
+        """
+        Release the MediaPipe graph of the recognizer.
+        """
+        if self.recognizer is not None:
+            self.recognizer.close()
+            self.recognizer = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
 
     def recognize_landmarks_gestures(self, image_path):
         """
@@ -25,7 +105,64 @@ class Recognizer:
         :param image_path: The path to the input image.
         :return: The recognized landmarks.
         """
-        image = mp.Image.create_from_file(image_path)
-        results = self.recognizer.recognize(image)
+        if self.cache is None:
+            return self.recognizer.recognize(mp.Image.create_from_file(image_path))
+
+        with open(image_path, 'rb') as f:
+            key = self.cache.key_for_bytes(f.read())
+        results = self.cache.get(key)
+        if results is None:
+            results = self.recognizer.recognize(mp.Image.create_from_file(image_path))
+            self.cache.put(key, results)
+
+        return results
+
+    def recognize_landmarks_gestures_from_image(self, image):
+        """
+        Recognize the landmarks in an image that is already in memory.
+
+        :param image: BGR image, as produced by cv2 and the PipelineManager.
+        :return: The recognized landmarks.
+        """
+        key = None
+        if self.cache is not None:
+            key = self.cache.key_for_array(image)
+            results = self.cache.get(key)
+            if results is not None:
+                return results
+
+        results = self.recognizer.recognize(self.to_mp_image(image))
 
+        if key is not None:
+            self.cache.put(key, results)
         return results
+
+    def recognize_video_frame(self, image, timestamp_ms):
+        """
+        Recognize the landmarks in a frame of a video, in VIDEO running mode.
+
+        :param image: BGR frame.
+        :param timestamp_ms: Timestamp of the frame in milliseconds, increasing from frame to frame.
+        :return: The recognized landmarks.
+        """
+        return self.recognizer.recognize_for_video(self.to_mp_image(image), timestamp_ms)
+
+    def recognize_live_frame(self, image, timestamp_ms):
+        """
+        Send a frame of a live stream for recognition, in LIVE_STREAM running mode. The result is passed to the
+        result callback; frames arriving while the recognizer is busy may be dropped.
+
+        :param image: BGR frame.
+        :param timestamp_ms: Timestamp of the frame in milliseconds, increasing from frame to frame.
+        """
+        self.recognizer.recognize_async(self.to_mp_image(image), timestamp_ms)
+
+    @staticmethod
+    def to_mp_image(image):
+        """
+        :param image: BGR or single channel image.
+        :return: MediaPipe SRGB image.
+        """
+        conversion = cv2.COLOR_GRAY2RGB if image.ndim == 2 else cv2.COLOR_BGR2RGB
+        rgb_image = np.ascontiguousarray(cv2.cvtColor(image, conversion))
+        return mp.Image(image_format=mp.ImageFormat.SRGB, data=rgb_image)
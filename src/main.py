@@ -1,14 +1,18 @@
 import json
 import os
 import asyncio
+import time
 from dotenv import load_dotenv
 import cv2
+import numpy as np
 
 from src.colorization.Zhang import create_colorized_pictures
-from src.evaluation.LandmarkMerger import LandmarkMerger
+from src.evaluation.GroundTruthStore import GroundTruthStore
+from src.evaluation.ParallelEvaluator import ParallelEvaluator, close_worker
 from src.evaluation.PCKCalculator import PCKCalculator
+from src.evaluation.PCKEngine import PCKEngine
 from src.evaluation.recognizer import Recognizer
-from src.pipelines.PipelineManager import PipelineManager
+from src.pipelines.FrameExecutor import EarlyExitPolicy
 
 IR_IMAGE_DIRECTORY = '../resources/evaluation_dataset/IR'
 IR_GROUND_TRUTH = '../resources/evaluation_dataset/IR_annotations'
@@ -18,104 +22,93 @@ RGB_GROUND_TRUTH = '../resources/evaluation_dataset/RGB_annotation'
 
 OUTPUT_FILE = "pck_results_three.json"
 
-def rotate_landmarks_90_counterclockwise(landmarks):
-    rotated_landmarks = []
-    for group in landmarks:
-        rotated_group = []
-        for point in group:
-            x, y = point['x'], point['y']
-            rotated_group.append({'x': y, 'y': 1 - x})
-        rotated_landmarks.append(rotated_group)
-    return rotated_landmarks
+# Set to True to write the output of every pipeline stage below STYLIZED_PICTURES_DIRECTORY
+SAVE_ARTIFACTS = False
+STYLIZED_PICTURES_DIRECTORY = '../resources/stylized-pictures'
+PCK_CURVE_FILE = "pck_curve.json"
 
-def main(threshold=0.05, output_file=None):
+# Set to True to keep the parsed annotations next to their directories as .npz files
+CACHE_GROUND_TRUTH = True
 
-    # Load environment variables from the .env file
-    load_dotenv()
-    # Initialize the PCKCalculator
-    pck_calculator = PCKCalculator(threshold=threshold)
-
-    # Schedule upper and lower bound calculations concurrently
-    pck_calculator.calculate_pck_bound(
-            image_directory=RGB_IMAGE_DIRECTORY,
-            ground_truth_directory=RGB_GROUND_TRUTH,
-            bound_type="upper"
-    )
-
-    pck_calculator.calculate_pck_bound(
-            image_directory=IR_IMAGE_DIRECTORY,
-            ground_truth_directory=IR_GROUND_TRUTH,
-            bound_type="lower"
-    )
-
-    total_pck = {"Left": [], "Right": []}
-    first_total_pck = {"Left": [], "Right": []}
-    second_total_pck = {"Left": [], "Right": []}
+# Number of worker processes for the evaluation, None for one per CPU core
+PROCESSES = None
 
-    pipeline_manager = PipelineManager('../resources/stylized-pictures')
-    recognizer = Recognizer(os.getenv("MODEL_PATH"))
+# Colorizer inference backend, see COLORIZER_BACKENDS. Compare the PCK of a backend with that of 'eager'
+COLORIZER_BACKEND = 'eager'
+# IR frames calibrating the 'int8_static' colorizers
+COLORIZER_CALIBRATION_DIRECTORY = IR_IMAGE_DIRECTORY
 
-    for file_name in os.listdir(IR_GROUND_TRUTH):
-        if file_name.endswith('.json'):
-            json_file_path = os.path.join(IR_GROUND_TRUTH, file_name)
+# Set to True to keep the IR images single channel from box removal until colorization
+GRAYSCALE_PIPELINES = False
 
-            with open(json_file_path, 'r') as f:
-                ground_truth_data = json.load(f)
-            for entry in ground_truth_data:
+# Registered pipelines fused per image, the first two are reported as first_pck and second_pck
+FUSION_PIPELINES = ("siggraph17", "clahe")
+# One of MERGE_STRATEGIES: "open_palm", "confidence_weighted" or "median"
+MERGE_STRATEGY = "open_palm"
+# Set to an EarlyExitPolicy to skip the other pipelines when the cheap ones already found both hands
+EARLY_EXIT = None
 
-                image_name = entry["image"]
+# Set to True to compare the CLAHE-first cascade with the full fusion, written to CASCADE_REPORT_FILE
+CASCADE_REPORT = False
+CASCADE_REPORT_FILE = "cascade_report.json"
+CASCADE_POLICY = EarlyExitPolicy(cheap_pipelines=("clahe",), min_hands=2, min_confidence=0.5, min_gesture_score=0.0)
 
-                if image_name.startswith("49_"):
-                    continue
+THRESHOLDS = [0.01, 0.02, 0.03, 0.04, 0.05, 0.06, 0.07, 0.08, 0.09, 0.1, 0.15]
+PCK_CURVE_THRESHOLDS = np.linspace(0.0, 0.15, 31)
 
-                if image_name.startswith("10_"):
-                    continue
+def load_ground_truth(ground_truth_directory):
+    cache_path = f"{ground_truth_directory.rstrip('/')}.npz" if CACHE_GROUND_TRUTH else None
+    return GroundTruthStore.from_directory(ground_truth_directory, cache_path=cache_path)
 
-                if image_name.startswith("68_"):
-                    continue
 
-                if image_name.startswith("29_"):
-                    continue
+def collect_engines(evaluator):
+    """
+    Recognize the upper bound, lower bound and pipeline images once and wrap their landmarks in PCK engines,
+    so that they can be scored for any threshold afterwards.
 
+    :param evaluator: ParallelEvaluator used to recognize the images.
+    :return: dict
+        PCKEngine of the "upper_bound", "lower_bound", "final_pck", "first_pck" and "second_pck" results.
+    """
+    rgb_ground_truth = load_ground_truth(RGB_GROUND_TRUTH)
+    ir_ground_truth = load_ground_truth(IR_GROUND_TRUTH)
 
+    engines = {
+        "upper_bound": PCKEngine(*evaluator.collect_bound_landmarks(RGB_IMAGE_DIRECTORY, rgb_ground_truth)),
+        "lower_bound": PCKEngine(*evaluator.collect_bound_landmarks(IR_IMAGE_DIRECTORY, ir_ground_truth)),
+    }
 
-                ground_truth_landmarks = entry["landmarks"]
-                ground_truth_landmarks = rotate_landmarks_90_counterclockwise(ground_truth_landmarks)
-                image_path = f"{IR_IMAGE_DIRECTORY}/{image_name}"
+    ground_truth, predictions = evaluator.collect_pipeline_landmarks(IR_IMAGE_DIRECTORY,
+                                                                     ir_ground_truth.rotated_90_counterclockwise(),
+                                                                     image_rotation=cv2.ROTATE_90_COUNTERCLOCKWISE)
+    for name in ["final", "first", "second"]:
+        engines[f"{name}_pck"] = PCKEngine(ground_truth, predictions[name])
 
-                # if you cannot find the image in the IR_IMAGE_DIRECTORY, continue
-                if not os.path.exists(image_path):
-                    continue
+    return engines
 
-                image = cv2.imread(image_path)
-                rotated = cv2.rotate(image, cv2.ROTATE_90_COUNTERCLOCKWISE)
-                rotated_path = f"../resources/stylized-pictures/rotated/{image_name}_rotated.png"
-                cv2.imwrite(rotated_path, rotated)
-                image_path = rotated_path
 
-                first_pipeline_image_path = pipeline_manager.execute_first_pipeline(image_path, image_name)
-                first_results = recognizer.recognize_landmarks_gestures(first_pipeline_image_path)
-                first_pck = pck_calculator.calculate_pck(ground_truth_landmarks, first_results.hand_landmarks)
-
-
-                second_pipeline_image_path = pipeline_manager.execute_second_pipeline(image_path, image_name)
-                second_results = recognizer.recognize_landmarks_gestures(second_pipeline_image_path)
-                second_pck = pck_calculator.calculate_pck(ground_truth_landmarks, second_results.hand_landmarks)
-
-                landmark_merger = LandmarkMerger(first_results, second_results)
-                landmark_merger.merge_landmarks()
-
-                final_pck = pck_calculator.calculate_pck(ground_truth_landmarks, landmark_merger.final_landmarks)
+def create_evaluator(processes=1, early_exit=EARLY_EXIT, caches=True):
+    # Load environment variables from the .env file
+    load_dotenv()
+    return ParallelEvaluator(processes=processes, model_path=os.getenv("MODEL_PATH"),
+                             base_output_path=STYLIZED_PICTURES_DIRECTORY, save_artifacts=SAVE_ARTIFACTS,
+                             stage_cache_directory=os.getenv("STAGE_CACHE_DIR") if caches else None,
+                             recognition_cache=caches,
+                             colorizer_backend=COLORIZER_BACKEND,
+                             pipeline_options={"grayscale": GRAYSCALE_PIPELINES,
+                                               "colorizer_calibration_directory": COLORIZER_CALIBRATION_DIRECTORY},
+                             fusion_options={"pipelines": FUSION_PIPELINES, "merge_strategy": MERGE_STRATEGY,
+                                             "early_exit": early_exit})
 
-                total_pck["Left"].append(final_pck["Left"])
-                total_pck["Right"].append(final_pck["Right"])
 
-                first_total_pck["Left"].append(first_pck["Left"])
-                first_total_pck["Right"].append(first_pck["Right"])
+def main(threshold=0.05, output_file=None, processes=1):
 
-                second_total_pck["Left"].append(second_pck["Left"])
-                second_total_pck["Right"].append(second_pck["Right"])
+    with create_evaluator(processes) as evaluator:
+        engines = collect_engines(evaluator)
 
+    total_pck = engines["final_pck"].calculate_total_pck(threshold)
+    first_total_pck = engines["first_pck"].calculate_total_pck(threshold)
+    second_total_pck = engines["second_pck"].calculate_total_pck(threshold)
 
     final_val = PCKCalculator.calculate_final_pck(total_pck)
     first_final_val = PCKCalculator.calculate_final_pck(first_total_pck)
@@ -125,28 +118,109 @@ def main(threshold=0.05, output_file=None):
 
     output_file.append({
         "threshold": threshold,
-        "upper_bound": pck_calculator.upper_bound,
-        "lower_bound": pck_calculator.lower_bound,
+        "upper_bound": PCKCalculator.calculate_final_pck(engines["upper_bound"].calculate_total_pck(threshold)),
+        "lower_bound": PCKCalculator.calculate_final_pck(engines["lower_bound"].calculate_total_pck(threshold)),
         "final_pck": final_val,
         "first_pck": first_final_val,
         "second_pck": second_final_val
     })
 
 
+def sweep(thresholds, output_file, curve_thresholds=PCK_CURVE_THRESHOLDS, processes=1):
+    """
+    Evaluate all thresholds from a single detection pass over the datasets. Produces the same entries as
+    calling main once per threshold, and additionally returns the PCK curve and its AUC.
+
+    :param thresholds: Distance threshold factors to report.
+    :param output_file: List to which the result of each threshold is appended.
+    :param curve_thresholds: Sorted distance threshold factors at which the PCK curve is sampled.
+    :param processes: Number of worker processes recognizing the images, None for one per CPU core.
+    :return: dict
+        The PCK curve and AUC of the upper bound, lower bound and each pipeline.
+    """
+    with create_evaluator(processes) as evaluator:
+        engines = collect_engines(evaluator)
 
+    final_pck = {name: engine.calculate_final_pck(thresholds) for name, engine in engines.items()}
+    for index, threshold in enumerate(thresholds):
+        print(f"Threshold: {threshold}")
+        print(f"Final PCK: {final_pck['final_pck'][index]}")
+
+        output_file.append({"threshold": threshold,
+                            **{name: float(values[index]) for name, values in final_pck.items()}})
+
+    curves = {"thresholds": [float(threshold) for threshold in curve_thresholds]}
+    for name, engine in engines.items():
+        curves[name] = {"pck": engine.calculate_final_pck(curve_thresholds).tolist(),
+                        "auc": engine.calculate_auc(curve_thresholds)}
+
+    return curves
+
+
+def cascade_report(threshold=0.05, policy=CASCADE_POLICY, processes=1):
+    """
+    Run the fused pipelines on the IR dataset with and without the cascade, in which the cheap pipelines run
+    first and colorization only runs when they did not find confident hands. Both runs have the stage and
+    recognition caches disabled, so that their wall times measure the pipelines rather than cache reads.
+
+    :param threshold: Distance threshold factor of the PCK.
+    :param policy: EarlyExitPolicy of the cascade.
+    :param processes: Number of worker processes recognizing the images, None for one per CPU core.
+    :return: dict
+        Final PCK and wall time of both runs, the escalation rate of the cascade and its PCK difference. The
+        full run has no cheap pipelines to escalate from, so it has no escalation rate.
+    """
+    ground_truth = load_ground_truth(IR_GROUND_TRUTH).rotated_90_counterclockwise()
+
+    report = {"threshold": threshold, "min_hands": policy.min_hands, "min_confidence": policy.min_confidence,
+              "min_gesture_score": policy.min_gesture_score, "caches": "disabled"}
+    for name, early_exit in [("full", None), ("cascade", policy)]:
+        with create_evaluator(processes, early_exit, caches=False) as evaluator:
+            start_time = time.perf_counter()
+            landmarks, predictions = evaluator.collect_pipeline_landmarks(
+                IR_IMAGE_DIRECTORY, ground_truth, image_rotation=cv2.ROTATE_90_COUNTERCLOCKWISE)
+        report[name] = {
+            "seconds": time.perf_counter() - start_time,
+            "final_pck": PCKCalculator.calculate_final_pck(
+                PCKEngine(landmarks, predictions["final"]).calculate_total_pck(threshold)),
+        }
+        if early_exit is not None:
+            report[name]["escalation_rate"] = (float(evaluator.escalations.mean()) if len(evaluator.escalations)
+                                               else 0.0)
+
+    report["pck_difference"] = report["cascade"]["final_pck"] - report["full"]["final_pck"]
+    return report
 
 
 if __name__ == "__main__":
-    thresholds = [0.01, 0.02, 0.03, 0.04, 0.05, 0.06, 0.07, 0.08, 0.09, 0.1, 0.15]
     results = []
 
-    for threshold in thresholds:
-        print(f"Threshold: {threshold}")
-        main(threshold, results)
+    try:
+        curves = sweep(THRESHOLDS, results, processes=PROCESSES)
+    finally:
+        close_worker()
+        Recognizer.close_shared()
 
     print(results)
 
+    with open(PCK_CURVE_FILE, 'w') as f:
+        json.dump(curves, f, indent=4)
+
+    print(f"PCK curve saved to '{PCK_CURVE_FILE}'")
+
     with open(OUTPUT_FILE, 'w') as f:
         json.dump(results, f, indent=4)
 
     print(f"Results saved to '{OUTPUT_FILE}'")
+
+    if CASCADE_REPORT:
+        try:
+            report = cascade_report(processes=PROCESSES)
+        finally:
+            close_worker()
+            Recognizer.close_shared()
+
+        with open(CASCADE_REPORT_FILE, 'w') as f:
+            json.dump(report, f, indent=4)
+
+        print(f"Cascade report saved to '{CASCADE_REPORT_FILE}'")
@@ -0,0 +1,134 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from src.evaluation.LandmarkMerger import LandmarkMerger
+from src.pipelines.StageCache import StageCache
+
+
+class EarlyExitPolicy:
+    """
+    Class deciding whether the cheap pipelines of a frame found the hands well enough to skip the others.
+    """
+
+    def __init__(self, cheap_pipelines=("clahe",), min_hands=2, min_confidence=0.5, min_gesture_score=0.0):
+        """
+        Initialize the EarlyExitPolicy.
+
+        :param cheap_pipelines: Names of the pipelines run first.
+        :param min_hands: Number of hands one cheap pipeline must find.
+        :param min_confidence: Handedness score each of these hands must reach.
+        :param min_gesture_score: Score of the top gesture each of these hands must reach.
+        """
+        self.cheap_pipelines = tuple(cheap_pipelines)
+        self.min_hands = min_hands
+        self.min_confidence = min_confidence
+        self.min_gesture_score = min_gesture_score
+
+    def is_confident(self, results):
+        """
+        :param results: MediaPipe results of one pipeline.
+        :return: True if the results contain enough confident hands.
+        """
+        confidences = [handedness[0].score for handedness in results.handedness]
+        gesture_scores = [gestures[0].score for gestures in results.gestures]
+        return (len(confidences) >= self.min_hands
+                and all(score >= self.min_confidence for score in confidences)
+                and all(score >= self.min_gesture_score for score in gesture_scores))
+
+    def is_satisfied(self, pipeline_results):
+        """
+        :param pipeline_results: MediaPipe results of the cheap pipelines.
+        :return: True if the remaining pipelines can be skipped.
+        """
+        return any(self.is_confident(results) for results in pipeline_results)
+
+
+class FrameExecutor:
+    """
+    Class to run the enhancement pipelines of a frame concurrently and fuse their landmarks.
+
+    The temperature boxes are removed once, then every pipeline, followed by its own recognition, runs on a
+    thread of its own. Torch, OpenCV and MediaPipe release the GIL while they compute, so the latency of a
+    frame is close to that of the slowest pipeline instead of the sum of all of them. With an EarlyExitPolicy
+    the cheap pipelines run first and the others are skipped when they already found the hands.
+    """
+
+    def __init__(self, pipeline_manager, recognizers, pipelines=("siggraph17", "clahe"), merge_strategy="open_palm",
+                 early_exit=None):
+        """
+        Initialize the FrameExecutor.
+
+        :param pipeline_manager: PipelineManager running the pipelines, in which they are registered.
+        :param recognizers: One Recognizer per pipeline. MediaPipe graphs cannot be shared by concurrent threads,
+            so each pipeline needs its own recognizer. The FrameExecutor owns them and closes them in close.
+        :param pipelines: Names of the registered pipelines to run, in order of preference for the merger.
+        :param merge_strategy: Strategy of the LandmarkMerger, one of MERGE_STRATEGIES.
+        :param early_exit: EarlyExitPolicy, or None to always run every pipeline.
+        """
+        if len(recognizers) != len(pipelines):
+            raise ValueError("One recognizer is needed per pipeline.")
+
+        self.pipeline_manager = pipeline_manager
+        self.recognizers = dict(zip(pipelines, recognizers))
+        self.pipelines = tuple(pipelines)
+        self.merge_strategy = merge_strategy
+        self.early_exit = early_exit
+        self._executor = ThreadPoolExecutor(max_workers=len(pipelines), thread_name_prefix="pipeline-branch")
+
+    def close(self):
+        """
+        Stop the branch threads and release the MediaPipe graphs of the recognizers.
+        """
+        self._executor.shutdown()
+        for recognizer in self.recognizers.values():
+            recognizer.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def _run_branch(self, pipeline, image, no_boxes_image, no_boxes_identity, no_boxes_key, image_name):
+        stages = self.pipeline_manager.pipeline_stages(pipeline)
+        if stages and stages[0].identity == no_boxes_identity:
+            output = self.pipeline_manager.run_stages(no_boxes_image, stages[1:], image_name, no_boxes_key)
+        else:
+            output = self.pipeline_manager.run_stages(image, stages, image_name)
+        return self.recognizers[pipeline].recognize_landmarks_gestures_from_image(output)
+
+    def _run_branches(self, pipelines, *branch_args):
+        futures = [self._executor.submit(self._run_branch, pipeline, *branch_args) for pipeline in pipelines]
+        return {pipeline: future.result() for pipeline, future in zip(pipelines, futures)}
+
+    def process_frame(self, image, image_name):
+        """
+        Run the pipelines on a frame concurrently and merge their landmarks. The branches run on the threads of
+        the FrameExecutor, so it can be called from any thread, including one running an event loop.
+
+        :param image: BGR image.
+        :param image_name: Name of the image for artifact file naming.
+        :return: tuple
+            Dictionary mapping every pipeline name to its recognition results, None for skipped pipelines, and
+            the merged landmarks.
+        """
+        pipeline_manager = self.pipeline_manager
+        no_boxes_stage = pipeline_manager.no_boxes_stage()
+        no_boxes_key = None
+        if pipeline_manager.stage_cache is not None:
+            no_boxes_key = StageCache.key_for_stage(StageCache.key_for_image(image), no_boxes_stage)
+        no_boxes_image = pipeline_manager.run_stage(no_boxes_stage, image, image_name, no_boxes_key)
+        branch_args = (image, no_boxes_image, no_boxes_stage.identity, no_boxes_key, image_name)
+
+        remaining = list(self.pipelines)
+        results = {}
+        if self.early_exit is not None:
+            cheap = [pipeline for pipeline in self.pipelines if pipeline in self.early_exit.cheap_pipelines]
+            results.update(self._run_branches(cheap, *branch_args))
+            remaining = [pipeline for pipeline in self.pipelines if pipeline not in results]
+            if self.early_exit.is_satisfied(list(results.values())):
+                remaining = []
+        results.update(self._run_branches(remaining, *branch_args))
+
+        landmark_merger = LandmarkMerger(*[results[pipeline] for pipeline in self.pipelines if pipeline in results])
+        landmark_merger.merge_landmarks(self.merge_strategy)
+        return {pipeline: results.get(pipeline) for pipeline in self.pipelines}, landmark_merger.final_landmarks
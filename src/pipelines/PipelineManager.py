@@ -1,7 +1,56 @@
+import json
+import os
+
 import cv2
+import matplotlib.pyplot as plt
 import numpy as np
+import torch
+
+from src.colorization.Zhang import (INFERENCE_SIZE, calibration_batches, calibration_fingerprint, colorize_batch,
+                                   colorize_image, create_colorized_pictures, get_colorizer, load_img)
+from src.pipelines.StageCache import StageCache
+from src.pipelines.TemperatureBoxRemover import TemperatureBoxRemover
+
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg')
+
+# Number of frames of the calibration directory used to calibrate the 'int8_static' colorizers
+CALIBRATION_IMAGES = 16
+
+# HSV (lower, upper) bounds of the red and green temperature boxes
+TEMPERATURE_BOX_HSV_RANGES = (
+    ((0, 120, 70), (10, 255, 255)),
+    ((170, 120, 70), (180, 255, 255)),
+    ((35, 100, 100), (85, 255, 255)),
+)
+
+
+class Stage:
+    """
+    A named step of a pipeline that maps an image array to a new image array.
+    """
 
-from src.colorization.Zhang import create_colorized_pictures
+    def __init__(self, name, function, artifact_path=None, params=None, cacheable=True, deterministic=True):
+        """
+        :param name: Name of the stage.
+        :param function: Function taking and returning an image array.
+        :param artifact_path: Path of the debug artifact relative to the base output directory, with a
+            '{name}' placeholder for the image name. No artifact is written if None.
+        :param params: JSON serializable parameters that, with the name, determine the output of the stage.
+        :param cacheable: Whether the output is worth storing in the StageCache. False for stages that are
+            cheaper to recompute than to load, whose keys still chain to the stages after them.
+        :param deterministic: Whether the input and parameters determine the output. False for stages that keep
+            state across images, so that neither they nor the stages after them are cached.
+        """
+        self.name = name
+        self.function = function
+        self.artifact_path = artifact_path
+        self.params = params or {}
+        self.cacheable = cacheable
+        self.deterministic = deterministic
+
+    @property
+    def identity(self):
+        return self.name, json.dumps(self.params, sort_keys=True, default=str)
 
 
 class PipelineManager:
@@ -9,12 +58,115 @@ class PipelineManager:
     Class to manage and execute transformation pipelines.
     """
 
-    def __init__(self, base_output_path="../../resources/stylized-pictures"):
+    def __init__(self, base_output_path="../../resources/stylized-pictures", use_gpu=False,
+                 colorizer_dtype=torch.float32, save_artifacts=False, stage_cache_directory=None,
+                 temperature_box_hsv_ranges=TEMPERATURE_BOX_HSV_RANGES, clahe_clip_limit=2.0,
+                 clahe_tile_grid_size=(8, 8), colorizer_backend='eager', colorization_size=INFERENCE_SIZE,
+                 colorization_output_size=None, grayscale=False, box_removal='full', reuse_box_mask=False,
+                 colorizer_calibration_directory=None):
         """
         Initialize the PipelineManager with a base output directory.
         :param base_output_path: Base path to save transformed images.
+        :param use_gpu: Whether the colorizers run on the GPU.
+        :param colorizer_dtype: Floating point type the colorizers run in.
+        :param save_artifacts: Whether the in-memory pipelines write the output of every stage for debugging.
+        :param stage_cache_directory: Directory of the StageCache, stage outputs are not cached if None.
+        :param temperature_box_hsv_ranges: HSV (lower, upper) bounds of the temperature boxes.
+        :param clahe_clip_limit: Contrast limit of CLAHE.
+        :param clahe_tile_grid_size: Number of CLAHE tiles in each direction.
+        :param colorizer_backend: Inference backend of the colorizers, one of COLORIZER_BACKENDS.
+        :param colorization_size: (height, width) of the L channel fed to the colorizers.
+        :param colorization_output_size: Resolution of the colorized images, None for the input resolution, the
+            length of the longest side, or (height, width). See HAND_LANDMARK_INPUT_SIZE before shrinking it.
+        :param grayscale: Whether the stages after box detection work on single channel images, as IR frames
+            only carry intensity. The pipeline outputs stay three-channel BGR for MediaPipe.
+        :param box_removal: 'full' to inpaint and blur the whole frame, 'roi' to only process the regions of the
+            temperature boxes with a TemperatureBoxRemover. 'full' keeps results comparable with earlier runs.
+        :param reuse_box_mask: With 'roi', whether consecutive frames of the same size reuse the box regions.
+        :param colorizer_calibration_directory: Directory of IR frames calibrating the 'int8_static' colorizers,
+            once their boxes are removed and they are inverted like the frames the colorizers see. Random L
+            channels if None.
         """
         self.base_output_path = base_output_path
+        self.save_artifacts = save_artifacts
+        self.use_gpu = use_gpu
+        self.colorizer_dtype = colorizer_dtype
+        self.stage_cache = StageCache(stage_cache_directory) if stage_cache_directory else None
+        self.temperature_box_hsv_ranges = temperature_box_hsv_ranges
+        self.clahe_clip_limit = clahe_clip_limit
+        self.clahe_tile_grid_size = tuple(clahe_tile_grid_size)
+        self.colorizer_backend = colorizer_backend
+        self.colorization_size = tuple(colorization_size)
+        self.colorization_output_size = colorization_output_size
+        self.grayscale = grayscale
+        if box_removal not in ('full', 'roi'):
+            raise ValueError("box_removal must be 'full' or 'roi'.")
+        self.box_removal = box_removal
+        self.box_remover = TemperatureBoxRemover(temperature_box_hsv_ranges, grayscale, reuse_box_mask)
+        self.colorizer_calibration_directory = colorizer_calibration_directory
+        self._calibration_inputs = None
+        self._calibration_key = None
+
+        # Enhancement pipelines by name, each a function returning its list of stages
+        self.pipelines = {
+            "siggraph17": lambda: self.first_pipeline_stages('siggraph17'),
+            "eccv16": lambda: self.first_pipeline_stages('eccv16'),
+            "clahe": self.second_pipeline_stages,
+        }
+
+    def load_colorizers(self, models=('siggraph17', 'eccv16')):
+        """
+        Build the shared colorizers up front so that the first image does not pay for model setup.
+        :param models: Names of the colorizers to load.
+        """
+        for model in models:
+            self.colorizer(model)
+
+    def colorizer(self, colorization_model='siggraph17'):
+        """
+        :param colorization_model: Model to use for colorization ('siggraph17' or 'eccv16').
+        :return: The shared colorizer for the device, dtype and backend of this PipelineManager, calibrated on
+            the calibration directory for 'int8_static'.
+        """
+        # Resolved for every image, so the calibration inputs are hashed once in colorizer_calibration
+        calibration_inputs = self.colorizer_calibration()
+        return get_colorizer(colorization_model, device='cuda' if self.use_gpu else 'cpu',
+                             dtype=self.colorizer_dtype, backend=self.colorizer_backend,
+                             calibration_inputs=calibration_inputs, calibration_key=self._calibration_key)
+
+    def colorizer_calibration(self):
+        """
+        :return: The calibration batches of the 'int8_static' colorizers, computed and fingerprinted once, or None
+            if the backend needs none or no calibration directory is set.
+        """
+        if self.colorizer_backend != 'int8_static' or not self.colorizer_calibration_directory:
+            return None
+        if self._calibration_inputs is None:
+            self._calibration_inputs = self.colorizer_calibration_inputs(self.colorizer_calibration_directory)
+            self._calibration_key = calibration_fingerprint(self._calibration_inputs)
+        return self._calibration_inputs
+
+    def colorizer_calibration_inputs(self, image_directory, max_images=CALIBRATION_IMAGES):
+        """
+        Remove the boxes of the first frames of a directory and invert them, as the first pipeline does before
+        colorization, and turn them into calibration batches.
+        :param image_directory: Directory of IR frames.
+        :param max_images: Maximum number of frames used.
+        :return: List of L channel batches, see calibration_batches.
+        """
+        image_names = sorted(file_name for file_name in os.listdir(image_directory)
+                             if file_name.lower().endswith(IMAGE_EXTENSIONS))[:max_images]
+        if not image_names:
+            raise ValueError(f"No calibration images found in {image_directory}.")
+
+        preprocessing_stages = self.first_pipeline_stages()[:-1]
+        images = []
+        for image_name in image_names:
+            image = cv2.imread(os.path.join(image_directory, image_name))
+            for stage in preprocessing_stages:
+                image = stage.function(image)
+            images.append(image if image.ndim == 2 else cv2.cvtColor(image, cv2.COLOR_BGR2RGB))
+        return calibration_batches(images, self.colorization_size)
 
     def remove_temperature_boxes(self, image_path, image_name):
         """
@@ -23,29 +175,276 @@ class PipelineManager:
         :param image_name: Name of the image for output file naming.
         :return: Path to the processed image with no boxes.
         """
-        image_cv = cv2.imread(image_path)
-        hsv_image = cv2.cvtColor(image_cv, cv2.COLOR_BGR2HSV)
+        smoothed_image = self.no_boxes_stage().function(cv2.imread(image_path))
 
-        lower_red1 = np.array([0, 120, 70])
-        upper_red1 = np.array([10, 255, 255])
-        lower_red2 = np.array([170, 120, 70])
-        upper_red2 = np.array([180, 255, 255])
-        lower_green = np.array([35, 100, 100])
-        upper_green = np.array([85, 255, 255])
+        output_path = f"{self.base_output_path}/no_boxes/{image_name}_no_boxes.png"
+        cv2.imwrite(output_path, smoothed_image)
+        return output_path
 
-        mask_red1 = cv2.inRange(hsv_image, lower_red1, upper_red1)
-        mask_red2 = cv2.inRange(hsv_image, lower_red2, upper_red2)
-        mask_green = cv2.inRange(hsv_image, lower_green, upper_green)
-        mask_combined = mask_red1 | mask_red2 | mask_green
+    @staticmethod
+    def remove_temperature_boxes_from_image(image_cv, hsv_ranges=TEMPERATURE_BOX_HSV_RANGES, grayscale=False):
+        """
+        Remove temperature boxes (red and green regions) from an image.
+        :param image_cv: BGR image, or a single channel image that has no colored boxes to detect.
+        :param hsv_ranges: HSV (lower, upper) bounds of the temperature boxes.
+        :param grayscale: Whether to inpaint and blur the grayscale version of the image, once the boxes are
+            detected on the colors.
+        :return: BGR image with no boxes, or a single channel image if grayscale or if the input had one channel.
+        """
+        mask_combined = np.zeros(image_cv.shape[:2], np.uint8)
+        if image_cv.ndim == 3:
+            hsv_image = cv2.cvtColor(image_cv, cv2.COLOR_BGR2HSV)
+            for lower, upper in hsv_ranges:
+                mask_combined |= cv2.inRange(hsv_image, np.array(lower), np.array(upper))
+            if grayscale:
+                image_cv = cv2.cvtColor(image_cv, cv2.COLOR_BGR2GRAY)
 
         kernel = np.ones((5, 5), np.uint8)
         dilated_mask = cv2.dilate(mask_combined, kernel, iterations=1)
         image_no_boxes = cv2.inpaint(image_cv, dilated_mask, inpaintRadius=5, flags=cv2.INPAINT_TELEA)
-        smoothed_image = cv2.GaussianBlur(image_no_boxes, (5, 5), 0)
+        return cv2.GaussianBlur(image_no_boxes, (5, 5), 0)
 
-        output_path = f"{self.base_output_path}/no_boxes/{image_name}_no_boxes.png"
-        cv2.imwrite(output_path, smoothed_image)
-        return output_path
+    @staticmethod
+    def invert_image(image):
+        """
+        Invert the intensities of an image.
+        :param image: BGR or single channel image.
+        :return: Inverted image with the same channels.
+        """
+        return cv2.bitwise_not(image)
+
+    @staticmethod
+    def apply_clahe(image, clip_limit=2.0, tile_grid_size=(8, 8)):
+        """
+        Enhance the contrast of the grayscale version of an image with CLAHE.
+        :param image: BGR or single channel image.
+        :param clip_limit: Contrast limit of CLAHE.
+        :param tile_grid_size: Number of CLAHE tiles in each direction.
+        :return: Enhanced grayscale image, replicated to three channels.
+        """
+        gray_image = image if image.ndim == 2 else cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+
+        clahe = cv2.createCLAHE(clipLimit=clip_limit, tileGridSize=tile_grid_size)
+        enhanced_image = clahe.apply(gray_image)
+        return cv2.cvtColor(enhanced_image, cv2.COLOR_GRAY2BGR)
+
+    def colorize(self, image, colorization_model='siggraph17'):
+        """
+        Colorize an image with one of Zhang's models.
+        :param image: BGR image, or single channel image whose L channel is computed directly.
+        :param colorization_model: Model to use for colorization ('siggraph17' or 'eccv16').
+        :return: Colorized BGR image.
+        """
+        rgb_image = image if image.ndim == 2 else cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
+        colorized_image = colorize_image(rgb_image, model=self.colorizer(colorization_model), use_gpu=self.use_gpu,
+                                         dtype=self.colorizer_dtype, backend=self.colorizer_backend,
+                                         inference_size=self.colorization_size,
+                                         output_size=self.colorization_output_size)
+        # Same float to byte conversion as plt.imsave
+        colorized_image = (np.clip(colorized_image, 0, 1) * 255).astype(np.uint8)
+        return cv2.cvtColor(colorized_image, cv2.COLOR_RGB2BGR)
+
+    def no_boxes_stage(self):
+        """
+        Stage removing the temperature boxes, shared by all pipelines.
+        :return: The stage.
+        """
+        params = {"hsv_ranges": self.temperature_box_hsv_ranges, "grayscale": self.grayscale}
+        if self.box_removal == 'roi':
+            params.update({"box_removal": "roi", "reuse_box_mask": self.box_remover.reuse_mask})
+            # Reused box regions come from earlier frames, so the output is not a function of the input alone
+            return Stage("no_boxes", self.box_remover.remove, "no_boxes/{name}_no_boxes.png", params,
+                         deterministic=not self.box_remover.reuse_mask)
+
+        return Stage("no_boxes",
+                     lambda image: self.remove_temperature_boxes_from_image(image, self.temperature_box_hsv_ranges,
+                                                                            self.grayscale),
+                     "no_boxes/{name}_no_boxes.png", params)
+
+    def first_pipeline_stages(self, colorization_model='siggraph17'):
+        """
+        Stages of the first pipeline: box removal, inversion and colorization.
+        :param colorization_model: Model to use for colorization ('siggraph17' or 'eccv16').
+        :return: List of stages.
+        """
+        return [
+            self.no_boxes_stage(),
+            Stage("inverted", self.invert_image, "inverted/{name}_inverted.png", cacheable=False),
+            Stage(colorization_model, lambda image: self.colorize(image, colorization_model),
+                  f"{colorization_model}/{{name}}_{colorization_model}.png", self.colorization_params()),
+        ]
+
+    def colorization_params(self):
+        """
+        :return: Parameters that, with the model, determine the output of the colorization stage.
+        """
+        params = {"dtype": self.colorizer_dtype, "use_gpu": self.use_gpu, "backend": self.colorizer_backend,
+                  "inference_size": self.colorization_size, "output_size": self.colorization_output_size}
+        if self.colorizer_backend == 'int8_static':
+            params["calibration_directory"] = self.colorizer_calibration_directory
+        return params
+
+    def second_pipeline_stages(self):
+        """
+        Stages of the second pipeline: box removal and CLAHE.
+        :return: List of stages.
+        """
+        return [
+            self.no_boxes_stage(),
+            Stage("clahe", lambda image: self.apply_clahe(image, self.clahe_clip_limit, self.clahe_tile_grid_size),
+                  "not_detected/sharpened/{name}_sharpened.png",
+                  {"clip_limit": self.clahe_clip_limit, "tile_grid_size": self.clahe_tile_grid_size}),
+        ]
+
+    def register_pipeline(self, name, stages_factory):
+        """
+        Register an enhancement pipeline, so that it can be selected by name for fusion.
+        :param name: Name of the pipeline.
+        :param stages_factory: Function without arguments returning the list of stages of the pipeline. Pipelines
+            starting with no_boxes_stage() share the box removal with the others.
+        """
+        self.pipelines[name] = stages_factory
+
+    def pipeline_stages(self, name):
+        """
+        :param name: Name of a registered pipeline.
+        :return: List of stages of the pipeline.
+        """
+        if name not in self.pipelines:
+            raise ValueError(f"Unknown pipeline '{name}', expected one of {sorted(self.pipelines)}.")
+        return self.pipelines[name]()
+
+    def run_stages(self, image, stages, image_name, input_key=None):
+        """
+        Pass an image through a list of stages in memory.
+        :param image: BGR image.
+        :param stages: Stages to run, in order.
+        :param image_name: Name of the image for artifact file naming.
+        :param input_key: StageCache key of the image, see run_pipelines.
+        :return: Output of the last stage.
+        """
+        return self.run_pipelines(image, {"output": stages}, image_name, input_key)["output"]
+
+    def cached_output(self, stage, key):
+        """
+        :param stage: Stage whose output is looked up.
+        :param key: StageCache key of the output of the stage, or None.
+        :return: The cached output of the stage, or None if it is not cached.
+        """
+        if self.stage_cache is None or key is None or not stage.cacheable:
+            return None
+        return self.stage_cache.get(key)
+
+    def run_stage(self, stage, image, image_name, key=None, lookup=True):
+        """
+        Run a single stage and write its artifact if requested.
+        :param stage: Stage to run.
+        :param image: Input image of the stage.
+        :param image_name: Name of the image for artifact file naming.
+        :param key: StageCache key of the output of the stage, the stage always runs if None.
+        :param lookup: Whether to look the output up in the StageCache first, False when it is known to miss.
+        :return: Output of the stage.
+        """
+        output = self.cached_output(stage, key) if lookup else None
+        if output is None:
+            output = stage.function(image)
+            if self.stage_cache is not None and key is not None and stage.cacheable:
+                self.stage_cache.put(key, output)
+
+        if self.save_artifacts and stage.artifact_path:
+            self.save_artifact(output, stage.artifact_path.format(name=image_name))
+        return output
+
+    def run_pipelines(self, image, pipelines, image_name, input_key=None):
+        """
+        Run several pipelines on the same image. Stage prefixes shared by several pipelines (stages with the
+        same names and parameters in the same order) are computed once and their output is fanned out to every
+        pipeline. With a stage cache, each pipeline starts after its deepest cached stage, so that a frame whose
+        last stages are cached loads one array. Earlier outputs are only loaded or computed when a later stage
+        misses. Writing artifacts needs every output, so then every stage is loaded or computed in turn.
+        :param image: BGR image.
+        :param pipelines: Dictionary mapping pipeline names to their lists of stages.
+        :param image_name: Name of the image for artifact file naming.
+        :param input_key: StageCache key of the image when it is the output of earlier stages, so that the keys
+            stay chained. Derived from the image content if None.
+        :return: Dictionary mapping pipeline names to the output of their last stage.
+        """
+        if input_key is None and self.stage_cache is not None:
+            input_key = StageCache.key_for_image(image)
+        stage_outputs = {(): image}
+        stage_keys = {(): input_key}
+        outputs = {}
+
+        for pipeline_name, stages in pipelines.items():
+            paths = [()]
+            for stage in stages:
+                stage_path = paths[-1] + (stage.identity,)
+                if stage_path not in stage_keys:
+                    stage_keys[stage_path] = StageCache.key_for_stage(stage_keys[paths[-1]], stage)
+                paths.append(stage_path)
+
+            # Deepest stage whose output is already computed, or cached when no artifacts are written
+            start = 0
+            for index in reversed(range(len(stages))):
+                stage_path = paths[index + 1]
+                if stage_path not in stage_outputs and not self.save_artifacts:
+                    output = self.cached_output(stages[index], stage_keys[stage_path])
+                    if output is not None:
+                        stage_outputs[stage_path] = output
+                if stage_path in stage_outputs:
+                    start = index + 1
+                    break
+
+            for index in range(start, len(stages)):
+                stage_outputs[paths[index + 1]] = self.run_stage(stages[index], stage_outputs[paths[index]],
+                                                                 image_name, stage_keys[paths[index + 1]],
+                                                                 lookup=self.save_artifacts)
+            outputs[pipeline_name] = stage_outputs[paths[-1]]
+
+        return outputs
+
+    def execute_all_pipelines(self, image, image_name, colorization_model='siggraph17'):
+        """
+        Execute the first and second transformation pipelines in memory, removing the temperature boxes once.
+        :param image: BGR image.
+        :param image_name: Name of the image for artifact file naming.
+        :param colorization_model: Model to use for colorization ('siggraph17' or 'eccv16').
+        :return: Tuple of the transformed BGR images of the first and second pipeline.
+        """
+        outputs = self.run_pipelines(image, {
+            "first": self.first_pipeline_stages(colorization_model),
+            "second": self.second_pipeline_stages(),
+        }, image_name)
+        return outputs["first"], outputs["second"]
+
+    def save_artifact(self, image, relative_path):
+        """
+        Write an intermediate image below the base output directory.
+        :param image: BGR image.
+        :param relative_path: Path relative to the base output directory.
+        """
+        output_path = f"{self.base_output_path}/{relative_path}"
+        os.makedirs(os.path.dirname(output_path), exist_ok=True)
+        cv2.imwrite(output_path, image)
+
+    def execute_first_pipeline_on_image(self, image, image_name, colorization_model='siggraph17'):
+        """
+        Execute the first transformation pipeline in memory.
+        :param image: BGR image.
+        :param image_name: Name of the image for artifact file naming.
+        :param colorization_model: Model to use for colorization ('siggraph17' or 'eccv16').
+        :return: Transformed BGR image.
+        """
+        return self.run_stages(image, self.first_pipeline_stages(colorization_model), image_name)
+
+    def execute_second_pipeline_on_image(self, image, image_name):
+        """
+        Execute the second transformation pipeline in memory.
+        :param image: BGR image.
+        :param image_name: Name of the image for artifact file naming.
+        :return: Transformed BGR image.
+        """
+        return self.run_stages(image, self.second_pipeline_stages(), image_name)
 
     def execute_first_pipeline(self, image_path, image_name, colorization_model='siggraph17'):
         """
@@ -55,14 +454,12 @@ class PipelineManager:
         :param colorization_model: Model to use for colorization ('siggraph17' or 'eccv16').
         :return: Path to the transformed image.
         """
-        no_boxes_image_path = self.remove_temperature_boxes(image_path, image_name)
-        inverted_image = cv2.bitwise_not(cv2.imread(no_boxes_image_path))
-        inverted_image_path = f"{self.base_output_path}/inverted/{image_name}_inverted.png"
-        cv2.imwrite(inverted_image_path, inverted_image)
+        colorized_image = self.execute_first_pipeline_on_image(cv2.imread(image_path), image_name, colorization_model)
 
-        if colorization_model == 'eccv16':
-            return self.colorize_zhang_eccv16(inverted_image_path, image_name)
-        return self.colorize_zhang_siggraph17(inverted_image_path, image_name)
+        output_path = f"{self.base_output_path}/{colorization_model}/{image_name}_{colorization_model}.png"
+        os.makedirs(os.path.dirname(output_path), exist_ok=True)
+        cv2.imwrite(output_path, colorized_image)
+        return output_path
 
     def execute_second_pipeline(self, image_path, image_name):
         """
@@ -71,22 +468,14 @@ class PipelineManager:
         :param image_name: Name of the image for output file naming.
         :return: Path to the transformed image.
         """
-        no_boxes_image_path = self.remove_temperature_boxes(image_path, image_name)
-        image = cv2.imread(no_boxes_image_path, cv2.IMREAD_GRAYSCALE)
-
-        clahe = cv2.createCLAHE(clipLimit=2.0, tileGridSize=(8, 8))
-        enhanced_image = clahe.apply(image)
-        clahe_output_path = f"{self.base_output_path}/clahe/{image_name}_clahe.jpg"
-        cv2.imwrite(clahe_output_path, enhanced_image)
+        sharpened_image = self.execute_second_pipeline_on_image(cv2.imread(image_path), image_name)
 
-        sharpened_image = cv2.cvtColor(enhanced_image, cv2.COLOR_GRAY2RGB)
         sharpened_image_path = f"{self.base_output_path}/not_detected/sharpened/{image_name}_sharpened.png"
+        os.makedirs(os.path.dirname(sharpened_image_path), exist_ok=True)
         cv2.imwrite(sharpened_image_path, sharpened_image)
-
         return sharpened_image_path
 
-    @staticmethod
-    def colorize_zhang_siggraph17(image_path, image_name):
+    def colorize_zhang_siggraph17(self, image_path, image_name):
         """
         Colorize the image using Zhang's SIGGRAPH17 model.
         :param image_path: Path to the input image.
@@ -94,11 +483,13 @@ class PipelineManager:
         :return: Path to the colorized image.
         """
         print(f"Colorizing {image_name} using Zhang SIGGRAPH17 model...")
-        create_colorized_pictures(model='siggraph17', img_path=image_path, save_prefix=image_name)
+        create_colorized_pictures(model='siggraph17', img_path=image_path, use_gpu=self.use_gpu,
+                                  save_prefix=image_name, dtype=self.colorizer_dtype,
+                                  inference_size=self.colorization_size, output_size=self.colorization_output_size,
+                                  backend=self.colorizer_backend, calibration_inputs=self.colorizer_calibration())
         return f'../../resources/stylized-pictures/siggraph17/{image_name}_siggraph17.png'
 
-    @staticmethod
-    def colorize_zhang_eccv16(image_path, image_name):
+    def colorize_zhang_eccv16(self, image_path, image_name):
         """
         Colorize the image using Zhang's ECCV16 model.
         :param image_path: Path to the input image.
@@ -106,5 +497,40 @@ class PipelineManager:
         :return: Path to the colorized image.
         """
         print(f"Colorizing {image_name} using Zhang ECCV16 model...")
-        create_colorized_pictures(model='eccv16', img_path=image_path, save_prefix=image_name)
+        create_colorized_pictures(model='eccv16', img_path=image_path, use_gpu=self.use_gpu,
+                                  save_prefix=image_name, dtype=self.colorizer_dtype,
+                                  inference_size=self.colorization_size, output_size=self.colorization_output_size,
+                                  backend=self.colorizer_backend, calibration_inputs=self.colorizer_calibration())
         return f'../../resources/stylized-pictures/eccv16/{image_name}_eccv16.png'
+
+    def colorize_directory(self, input_directory, colorization_model='siggraph17', batch_size=8):
+        """
+        Colorize every image in a directory in batches.
+        :param input_directory: Directory containing the images to colorize.
+        :param colorization_model: Model to use for colorization ('siggraph17' or 'eccv16').
+        :param batch_size: Number of images per forward pass of the colorizer.
+        :return: Paths to the colorized images, in sorted order of the input file names.
+        """
+        image_names = sorted(file_name for file_name in os.listdir(input_directory)
+                             if file_name.lower().endswith(IMAGE_EXTENSIONS))
+        output_directory = f"{self.base_output_path}/{colorization_model}"
+        os.makedirs(output_directory, exist_ok=True)
+
+        output_paths = []
+        # Only one batch of images is held in memory at a time
+        for start in range(0, len(image_names), batch_size):
+            batch_names = image_names[start:start + batch_size]
+            images = [load_img(os.path.join(input_directory, image_name), keep_gray=self.grayscale)
+                      for image_name in batch_names]
+            print(f"Colorizing {len(images)} images using Zhang {colorization_model} model...")
+            colorized_images = colorize_batch(images, model=self.colorizer(colorization_model), batch_size=batch_size,
+                                              use_gpu=self.use_gpu, dtype=self.colorizer_dtype,
+                                              backend=self.colorizer_backend, inference_size=self.colorization_size,
+                                              output_size=self.colorization_output_size)
+
+            for image_name, colorized_image in zip(batch_names, colorized_images):
+                output_path = f"{output_directory}/{image_name}_{colorization_model}.png"
+                plt.imsave(output_path, colorized_image)
+                output_paths.append(output_path)
+
+        return output_paths
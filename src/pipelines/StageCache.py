@@ -0,0 +1,118 @@
+import hashlib
+import json
+import os
+import threading
+
+import numpy as np
+
+from src.utils.atomic_write import atomic_write
+
+
+class StageCache:
+    """
+    On-disk cache of pipeline stage outputs.
+
+    The key of a stage output is derived from the key of its input, the stage name and the stage parameters.
+    Changing the parameters of one stage therefore only invalidates that stage and the stages after it.
+    Entries are evicted least recently used first once the cache exceeds its size limit.
+    """
+
+    def __init__(self, cache_directory, max_size_bytes=4 * 1024 * 1024 * 1024):
+        """
+        Initialize the StageCache.
+
+        :param cache_directory: Directory in which the stage outputs are stored.
+        :param max_size_bytes: Size of the cache above which the least recently used entries are evicted.
+        """
+        self.cache_directory = cache_directory
+        self.max_size_bytes = max_size_bytes
+        os.makedirs(cache_directory, exist_ok=True)
+
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._size = sum(entry.stat().st_size for entry in os.scandir(cache_directory)
+                         if entry.name.endswith('.npy'))
+
+    @staticmethod
+    def key_for_image(image):
+        """
+        :param image: Input image array of a pipeline.
+        :return: The key of the image.
+        """
+        image = np.ascontiguousarray(image)
+        header = f"{image.dtype.str}:{image.shape}:".encode()
+        return hashlib.sha256(header + image.tobytes()).hexdigest()
+
+    @staticmethod
+    def key_for_stage(input_key, stage):
+        """
+        :param input_key: The key of the input of the stage.
+        :param stage: The stage.
+        :return: The key of the output of the stage, or None if its input has no key or its output depends on
+            more than its input and parameters, so that neither it nor the stages after it are cached.
+        """
+        if input_key is None or not stage.deterministic:
+            return None
+        description = json.dumps({"input": input_key, "stage": stage.name, "params": stage.params},
+                                 sort_keys=True, default=str)
+        return hashlib.sha256(description.encode()).hexdigest()
+
+    def _entry_path(self, key):
+        return os.path.join(self.cache_directory, f"{key}.npy")
+
+    def get(self, key):
+        """
+        :param key: The key of a stage output.
+        :return: The cached stage output, or None if it was not computed before.
+        """
+        path = self._entry_path(key)
+        try:
+            output = np.load(path)
+            # Mark the entry as recently used
+            os.utime(path)
+        except (OSError, ValueError):
+            with self._lock:
+                self.misses += 1
+            return None
+
+        with self._lock:
+            self.hits += 1
+        return output
+
+    def put(self, key, output):
+        """
+        :param key: The key of a stage output.
+        :param output: The stage output.
+        """
+        path = self._entry_path(key)
+
+        def write(tmp_path):
+            with open(tmp_path, 'wb') as f:
+                np.save(f, output)
+
+        atomic_write(path, write)
+
+        with self._lock:
+            self._size += os.path.getsize(path)
+            if self._size > self.max_size_bytes:
+                self.evict()
+
+    def evict(self):
+        """
+        Delete the least recently used entries until the cache is below its size limit.
+        """
+        entries = [entry for entry in os.scandir(self.cache_directory) if entry.name.endswith('.npy')]
+        entries.sort(key=lambda entry: entry.stat().st_mtime)
+        self._size = sum(entry.stat().st_size for entry in entries)
+
+        for entry in entries:
+            if self._size <= self.max_size_bytes:
+                break
+            try:
+                size = entry.stat().st_size
+                os.remove(entry.path)
+                self._size -= size
+            except OSError:
+                # Already evicted by another worker
+                pass
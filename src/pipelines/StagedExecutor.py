@@ -0,0 +1,204 @@
+import queue
+import threading
+import time
+
+from src.evaluation.LandmarkMerger import LandmarkMerger
+from src.pipelines.StageCache import StageCache
+
+# Marks the end of the input in the stage queues
+_END = object()
+
+
+class _StageError:
+    """
+    Wraps an exception raised by a stage, so that it travels down the queues and is raised in order.
+    """
+
+    def __init__(self, exception):
+        self.exception = exception
+
+
+class StagedExecutor:
+    """
+    Class to run a sequence of stages on a stream of items, one thread per stage, with bounded queues in
+    between. Consecutive items overlap across stages, a full queue blocks the stage feeding it and the outputs
+    come out in the order of the inputs.
+    """
+
+    def __init__(self, stages, queue_size=2):
+        """
+        Initialize the StagedExecutor.
+
+        :param stages: List of (name, function) tuples, every function mapping the output of the previous stage
+            to its own output.
+        :param queue_size: Maximum number of items waiting in front of each stage.
+        """
+        self.stages = stages
+        self.queue_size = queue_size
+        self.busy_time = {name: 0.0 for name, _ in stages}
+        self.processed = {name: 0 for name, _ in stages}
+        # Running sum and count of the queue depth samples, so that long streams use constant memory
+        self.queue_depth_sums = {name: 0 for name, _ in stages}
+        self.queue_depth_samples = {name: 0 for name, _ in stages}
+        self.elapsed = 0.0
+
+    @staticmethod
+    def _get(input_queue, stop):
+        while not stop.is_set():
+            try:
+                return input_queue.get(timeout=0.1)
+            except queue.Empty:
+                pass
+        return _END
+
+    @staticmethod
+    def _put(output_queue, item, stop):
+        # A full queue blocks the producer until the next stage catches up, or the run is stopped
+        while not stop.is_set():
+            try:
+                output_queue.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def _run_stage(self, name, function, input_queue, output_queue, stop):
+        while True:
+            self.queue_depth_sums[name] += input_queue.qsize()
+            self.queue_depth_samples[name] += 1
+            item = self._get(input_queue, stop)
+            if item is _END:
+                self._put(output_queue, _END, stop)
+                return
+            if not isinstance(item, _StageError):
+                start_time = time.perf_counter()
+                try:
+                    item = function(item)
+                except Exception as e:
+                    item = _StageError(e)
+                self.busy_time[name] += time.perf_counter() - start_time
+                self.processed[name] += 1
+            if not self._put(output_queue, item, stop):
+                return
+
+    def _feed(self, items, output_queue, stop):
+        try:
+            for item in items:
+                if not self._put(output_queue, item, stop):
+                    return
+        except Exception as e:
+            # Raised in run like a stage error, e.g. a video source that cannot be read
+            self._put(output_queue, _StageError(e), stop)
+        finally:
+            self._put(output_queue, _END, stop)
+
+    def run(self, items):
+        """
+        Run the stages on every item.
+
+        :param items: Iterable of inputs of the first stage.
+        :return: Generator of the outputs of the last stage, in the order of the inputs.
+        """
+        queues = [queue.Queue(maxsize=self.queue_size) for _ in range(len(self.stages) + 1)]
+        stop = threading.Event()
+        feeder = threading.Thread(target=self._feed, args=(items, queues[0], stop), daemon=True)
+        stage_threads = [threading.Thread(target=self._run_stage, name=f"stage-{name}",
+                                          args=(name, function, queues[index], queues[index + 1], stop),
+                                          daemon=True)
+                         for index, (name, function) in enumerate(self.stages)]
+
+        start_time = time.perf_counter()
+        feeder.start()
+        for thread in stage_threads:
+            thread.start()
+
+        try:
+            while True:
+                item = queues[-1].get()
+                if item is _END:
+                    break
+                if isinstance(item, _StageError):
+                    raise item.exception
+                yield item
+        finally:
+            # Also stops the stages when the consumer leaves early or a stage failed
+            stop.set()
+            for thread in stage_threads:
+                thread.join()
+            self.elapsed += time.perf_counter() - start_time
+
+    def occupancy(self):
+        """
+        :return: dict
+            For every stage, the fraction of the run it was busy, the number of items it processed and the mean
+            number of items waiting in front of it.
+        """
+        return {
+            name: {
+                "busy_fraction": self.busy_time[name] / self.elapsed if self.elapsed else 0.0,
+                "processed": self.processed[name],
+                "mean_queue_depth": (self.queue_depth_sums[name] / self.queue_depth_samples[name]
+                                     if self.queue_depth_samples[name] else 0.0),
+            }
+            for name, _ in self.stages
+        }
+
+
+def frame_stages(pipeline_manager, first_recognizer, second_recognizer, colorization_model='siggraph17'):
+    """
+    Stages running both pipelines, the recognitions and the landmark merger on dictionary items with an
+    "image_name" and a BGR "image", plus a "timestamp_ms" for recognizers in VIDEO running mode. OpenCV
+    preprocessing, the torch colorization and the MediaPipe recognitions each get their own stage.
+
+    :param pipeline_manager: PipelineManager running the pipelines.
+    :param first_recognizer: Recognizer of the first pipeline output, only used by the recognition stage.
+    :param second_recognizer: Recognizer of the second pipeline output, only used by the recognition stage.
+    :param colorization_model: Model to use for colorization ('siggraph17' or 'eccv16').
+    :return: List of (name, function) stages for the StagedExecutor. The last stage outputs the items with the
+        results of both pipelines and the merged landmarks added.
+    """
+    # Imported here so that the StagedExecutor itself does not need MediaPipe
+    from mediapipe.tasks.python import vision
+
+    first_stages = pipeline_manager.first_pipeline_stages(colorization_model)
+    preprocessing_stages, colorization_stage = first_stages[:-1], first_stages[-1]
+
+    def preprocess(item):
+        image = item.pop("image")
+        outputs = pipeline_manager.run_pipelines(image, {
+            "first": preprocessing_stages,
+            "second": pipeline_manager.second_pipeline_stages(),
+        }, item["image_name"])
+        item["preprocessed"], item["second_image"] = outputs["first"], outputs["second"]
+
+        # StageCache key of the preprocessed image, so that the colorization key stays chained to the input
+        item["preprocessed_key"] = None
+        if pipeline_manager.stage_cache is not None:
+            key = StageCache.key_for_image(image)
+            for stage in preprocessing_stages:
+                key = StageCache.key_for_stage(key, stage)
+            item["preprocessed_key"] = key
+        return item
+
+    def colorize(item):
+        item["first_image"] = pipeline_manager.run_stages(item.pop("preprocessed"), [colorization_stage],
+                                                          item["image_name"], item.pop("preprocessed_key"))
+        return item
+
+    def recognize_image(recognizer, image, item):
+        if recognizer.running_mode == vision.RunningMode.VIDEO:
+            return recognizer.recognize_video_frame(image, item["timestamp_ms"])
+        return recognizer.recognize_landmarks_gestures_from_image(image)
+
+    def recognize(item):
+        item["first_results"] = recognize_image(first_recognizer, item.pop("first_image"), item)
+        item["second_results"] = recognize_image(second_recognizer, item.pop("second_image"), item)
+        return item
+
+    def merge(item):
+        landmark_merger = LandmarkMerger(item["first_results"], item["second_results"])
+        landmark_merger.merge_landmarks()
+        item["final_landmarks"] = landmark_merger.final_landmarks
+        return item
+
+    return [("preprocess", preprocess), ("colorize", colorize), ("recognize", recognize), ("merge", merge)]
@@ -0,0 +1,318 @@
+import os
+import sys
+import threading
+import time
+from collections import deque
+
+import cv2
+import numpy as np
+from dotenv import load_dotenv
+from mediapipe.tasks.python import vision
+
+from src.evaluation.LandmarkMerger import LandmarkMerger
+from src.evaluation.recognizer import Recognizer
+from src.pipelines.PipelineManager import PipelineManager
+from src.pipelines.StagedExecutor import StagedExecutor, frame_stages
+
+
+class StreamStatistics:
+    """
+    Class to collect the per-frame latency and sustained frame rate of a stream.
+
+    The frame count, mean and maximum cover the whole stream, the percentiles the most recent frames, so that
+    memory stays constant however long a live feed runs.
+    """
+
+    def __init__(self, window=1000):
+        """
+        :param window: Number of most recent latencies kept for the percentiles.
+        """
+        self.latencies = deque(maxlen=window)
+        self.frames = 0
+        self.total_latency = 0.0
+        self.max_latency = 0.0
+        self.start_time = None
+        self.end_time = None
+
+    def add_frame(self, latency):
+        """
+        :param latency: Time in seconds from reading the frame to its merged landmarks.
+        """
+        self.end_time = time.perf_counter()
+        if self.start_time is None:
+            self.start_time = self.end_time - latency
+        self.latencies.append(latency)
+        self.frames += 1
+        self.total_latency += latency
+        self.max_latency = max(self.max_latency, latency)
+
+    def report(self):
+        """
+        :return: dict
+            Number of frames, sustained FPS and per-frame latency statistics in milliseconds.
+        """
+        if not self.frames:
+            return {"frames": 0, "fps": 0.0}
+
+        recent_latencies = np.array(self.latencies) * 1000
+        elapsed = self.end_time - self.start_time
+        return {
+            "frames": self.frames,
+            "fps": self.frames / elapsed if elapsed > 0 else 0.0,
+            "latency_ms_mean": self.total_latency / self.frames * 1000,
+            "latency_ms_p50": float(np.percentile(recent_latencies, 50)),
+            "latency_ms_p95": float(np.percentile(recent_latencies, 95)),
+            "latency_ms_max": self.max_latency * 1000,
+        }
+
+
+class StreamProcessor:
+    """
+    Class to run both pipelines and the landmark merger on the frames of a video file or camera.
+
+    Frames stay in memory. Each pipeline has its own GestureRecognizer in VIDEO or LIVE_STREAM running mode,
+    so MediaPipe can track the hands from frame to frame. In staged VIDEO mode, preprocessing, colorization,
+    recognition and merging of consecutive frames overlap on a StagedExecutor.
+    """
+
+    def __init__(self, pipeline_manager, model_path=None, running_mode=vision.RunningMode.VIDEO, rotation=None,
+                 colorization_model='siggraph17', staged=False, queue_size=2):
+        """
+        Initialize the StreamProcessor.
+
+        :param pipeline_manager: PipelineManager running the pipelines.
+        :param model_path: The path to the gesture recognizer model, defaults to the MODEL_PATH environment variable.
+        :param running_mode: vision.RunningMode.VIDEO or vision.RunningMode.LIVE_STREAM.
+        :param rotation: cv2 rotation code applied to every frame before the pipelines, or None.
+        :param colorization_model: Model to use for colorization ('siggraph17' or 'eccv16').
+        :param staged: Whether to run the frames through a StagedExecutor, only in VIDEO running mode.
+        :param queue_size: Maximum number of frames waiting in front of each stage when staged.
+        """
+        if running_mode not in (vision.RunningMode.VIDEO, vision.RunningMode.LIVE_STREAM):
+            raise ValueError("running_mode must be VIDEO or LIVE_STREAM.")
+        if staged and running_mode != vision.RunningMode.VIDEO:
+            raise ValueError("staged is only supported in VIDEO running mode.")
+
+        model_path = model_path or os.getenv("MODEL_PATH")
+        self.pipeline_manager = pipeline_manager
+        self.running_mode = running_mode
+        self.rotation = rotation
+        self.colorization_model = colorization_model
+        self.statistics = StreamStatistics()
+
+        # Live stream results arrive on MediaPipe threads, keyed by timestamp until both pipelines answered
+        self._pending = {}
+        self._completed = []
+        self._frame_start_times = {}
+        self._lock = threading.Lock()
+        self._frame_done = threading.Condition(self._lock)
+
+        self.recognizers = {}
+        for pipeline in ["first", "second"]:
+            callback = None
+            if running_mode == vision.RunningMode.LIVE_STREAM:
+                callback = self._make_live_callback(pipeline)
+            self.recognizers[pipeline] = Recognizer(model_path, running_mode=running_mode, result_callback=callback)
+
+        self.executor = None
+        if staged:
+            self.executor = StagedExecutor(frame_stages(pipeline_manager, self.recognizers["first"],
+                                                        self.recognizers["second"], colorization_model),
+                                           queue_size)
+
+    def close(self):
+        """
+        Release the MediaPipe graphs of both recognizers.
+        """
+        for recognizer in self.recognizers.values():
+            recognizer.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def _make_live_callback(self, pipeline):
+        def callback(result, _, timestamp_ms):
+            with self._lock:
+                results = self._pending.setdefault(timestamp_ms, {})
+                results[pipeline] = result
+                if len(results) < 2:
+                    return
+                del self._pending[timestamp_ms]
+                # Frames older than a completed one were dropped by one or both of the recognizers
+                for stale_timestamp in [t for t in self._pending if t < timestamp_ms]:
+                    del self._pending[stale_timestamp]
+                for stale_timestamp in [t for t in self._frame_start_times if t < timestamp_ms]:
+                    del self._frame_start_times[stale_timestamp]
+                start_time = self._frame_start_times.pop(timestamp_ms, None)
+
+            landmarks = self.merge(results["first"], results["second"])
+            with self._lock:
+                if start_time is not None:
+                    self.statistics.add_frame(time.perf_counter() - start_time)
+                self._completed.append((timestamp_ms, landmarks))
+                self._frame_done.notify_all()
+
+        return callback
+
+    @staticmethod
+    def merge(first_results, second_results):
+        """
+        :return: The merged landmarks of both pipelines.
+        """
+        landmark_merger = LandmarkMerger(first_results, second_results)
+        landmark_merger.merge_landmarks()
+        return landmark_merger.final_landmarks
+
+    def frames(self, source):
+        """
+        Read the frames of a video file or camera.
+
+        :param source: Path of a video file, camera index or an opened cv2.VideoCapture.
+        :return: Generator of (frame index, timestamp in milliseconds, BGR frame) tuples, with strictly
+            increasing timestamps as MediaPipe requires.
+        """
+        capture = source if isinstance(source, cv2.VideoCapture) else cv2.VideoCapture(source)
+        if not capture.isOpened():
+            raise ValueError(f"Could not open video source {source}.")
+
+        is_file = isinstance(source, str)
+        start_time = time.monotonic()
+        last_timestamp_ms = -1
+        frame_index = 0
+        try:
+            while True:
+                success, frame = capture.read()
+                if not success:
+                    break
+
+                if is_file:
+                    timestamp_ms = int(capture.get(cv2.CAP_PROP_POS_MSEC))
+                else:
+                    timestamp_ms = int((time.monotonic() - start_time) * 1000)
+                timestamp_ms = max(timestamp_ms, last_timestamp_ms + 1)
+                last_timestamp_ms = timestamp_ms
+
+                yield frame_index, timestamp_ms, frame
+                frame_index += 1
+        finally:
+            if capture is not source:
+                capture.release()
+
+    def process_frame(self, frame, frame_index, timestamp_ms):
+        """
+        Run both pipelines on a frame and recognize their outputs.
+
+        :param frame: BGR frame.
+        :param frame_index: Index of the frame, used for artifact file naming.
+        :param timestamp_ms: Timestamp of the frame in milliseconds.
+        :return: The merged landmarks in VIDEO mode, None in LIVE_STREAM mode where they are delivered
+            asynchronously.
+        """
+        start_time = time.perf_counter()
+        if self.rotation is not None:
+            frame = cv2.rotate(frame, self.rotation)
+
+        first_image, second_image = self.pipeline_manager.execute_all_pipelines(frame, f"frame_{frame_index:06d}",
+                                                                                self.colorization_model)
+
+        if self.running_mode == vision.RunningMode.LIVE_STREAM:
+            with self._lock:
+                self._frame_start_times[timestamp_ms] = start_time
+            self.recognizers["first"].recognize_live_frame(first_image, timestamp_ms)
+            self.recognizers["second"].recognize_live_frame(second_image, timestamp_ms)
+            return None
+
+        first_results = self.recognizers["first"].recognize_video_frame(first_image, timestamp_ms)
+        second_results = self.recognizers["second"].recognize_video_frame(second_image, timestamp_ms)
+        landmarks = self.merge(first_results, second_results)
+        self.statistics.add_frame(time.perf_counter() - start_time)
+        return landmarks
+
+    def occupancy(self):
+        """
+        :return: The occupancy of every stage of the StagedExecutor, see StagedExecutor.occupancy, or None if the
+            frames are not staged.
+        """
+        return self.executor.occupancy() if self.executor is not None else None
+
+    def _process_staged(self, source, max_frames):
+        def items():
+            for frame_index, timestamp_ms, frame in self.frames(source):
+                if max_frames is not None and frame_index >= max_frames:
+                    return
+                start_time = time.perf_counter()
+                if self.rotation is not None:
+                    frame = cv2.rotate(frame, self.rotation)
+                yield {"image_name": f"frame_{frame_index:06d}", "image": frame, "timestamp_ms": timestamp_ms,
+                       "start_time": start_time}
+
+        for item in self.executor.run(items()):
+            self.statistics.add_frame(time.perf_counter() - item["start_time"])
+            yield item["timestamp_ms"], item["final_landmarks"]
+
+    def flush(self, timeout=1.0):
+        """
+        Wait for the results of the frames still being recognized in LIVE_STREAM mode. Frames dropped by a
+        recognizer never complete, so the wait ends after the timeout at the latest.
+
+        :param timeout: Maximum time to wait in seconds.
+        :return: List of (timestamp in milliseconds, merged landmarks) tuples completed since the last call.
+        """
+        deadline = time.monotonic() + timeout
+        with self._frame_done:
+            while self._frame_start_times:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._frame_done.wait(remaining)
+            # Frames that did not complete in time were dropped
+            self._frame_start_times.clear()
+            self._pending.clear()
+            completed, self._completed = self._completed, []
+        return completed
+
+    def process(self, source, max_frames=None, flush_timeout=1.0):
+        """
+        Process the frames of a video file or camera.
+
+        :param source: Path of a video file, camera index or an opened cv2.VideoCapture.
+        :param max_frames: Stop after this many frames, None to process the whole source.
+        :param flush_timeout: Maximum time in seconds to wait for the last frames in LIVE_STREAM mode.
+        :return: Generator of (timestamp in milliseconds, merged landmarks) tuples, in frame order.
+        """
+        if self.executor is not None:
+            yield from self._process_staged(source, max_frames)
+            return
+
+        for frame_index, timestamp_ms, frame in self.frames(source):
+            if max_frames is not None and frame_index >= max_frames:
+                break
+
+            landmarks = self.process_frame(frame, frame_index, timestamp_ms)
+            if landmarks is not None:
+                yield timestamp_ms, landmarks
+
+            with self._lock:
+                completed, self._completed = self._completed, []
+            yield from completed
+
+        if self.running_mode == vision.RunningMode.LIVE_STREAM:
+            yield from self.flush(flush_timeout)
+
+
+if __name__ == "__main__":
+    load_dotenv()
+    # Video file path, or a camera index by default
+    video_source = sys.argv[1] if len(sys.argv) > 1 else 0
+    if isinstance(video_source, str) and video_source.isdigit():
+        video_source = int(video_source)
+
+    with StreamProcessor(PipelineManager('../resources/stylized-pictures'), staged=True) as stream_processor:
+        for _ in stream_processor.process(video_source):
+            pass
+        print(stream_processor.statistics.report())
+        for stage, stage_occupancy in stream_processor.occupancy().items():
+            print(f"{stage}: {stage_occupancy}")
@@ -0,0 +1,124 @@
+import threading
+
+import cv2
+import numpy as np
+
+
+class TemperatureBoxRemover:
+    """
+    Class to remove the temperature boxes of IR frames by working on their regions of interest only.
+
+    The boxes are located on a chroma map of the frame, a few cheap full-frame operations. The exact HSV masks,
+    the inpainting and the blur then run on padded crops around them, so their cost grows with the overlay area
+    rather than the frame size. Unlike the full-frame removal, the rest of the frame is not blurred.
+    """
+
+    def __init__(self, hsv_ranges, grayscale=False, reuse_mask=False, rescan_interval=30, margin=12):
+        """
+        Initialize the TemperatureBoxRemover.
+
+        :param hsv_ranges: HSV (lower, upper) bounds of the temperature boxes.
+        :param grayscale: Whether to return single channel frames, see PipelineManager.
+        :param reuse_mask: Whether to reuse the box regions of the previous frame of the same size instead of
+            locating them again, for consecutive frames of the same camera layout. The output of a frame then
+            depends on the frames before it.
+        :param rescan_interval: Number of frames after which reused box regions are located again.
+        :param margin: Pixels added around every box, giving the inpainting and the blur their context.
+        """
+        self.hsv_ranges = hsv_ranges
+        self.grayscale = grayscale
+        self.reuse_mask = reuse_mask
+        self.rescan_interval = rescan_interval
+        self.margin = margin
+        # Colored pixels of every HSV range have at least this chroma (max - min of B, G and R)
+        self.chroma_threshold = min(lower[1] * lower[2] // 255 for lower, _ in hsv_ranges)
+
+        self.scans = 0
+        self._cached_rois = None
+        self._cached_shape = None
+        self._frames_since_scan = 0
+        self._lock = threading.Lock()
+
+    def locate_boxes(self, image):
+        """
+        :param image: BGR image.
+        :return: List of (x0, y0, x1, y1) regions containing the colored boxes, with their margin.
+        """
+        blue, green, red = cv2.split(image)
+        chroma = cv2.subtract(cv2.max(cv2.max(blue, green), red), cv2.min(cv2.min(blue, green), red))
+        _, candidates = cv2.threshold(chroma, self.chroma_threshold - 1, 255, cv2.THRESH_BINARY)
+        contours, _ = cv2.findContours(candidates, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+
+        height, width = image.shape[:2]
+        rois = []
+        for contour in contours:
+            x, y, w, h = cv2.boundingRect(contour)
+            rois.append((max(0, x - self.margin), max(0, y - self.margin),
+                         min(width, x + w + self.margin), min(height, y + h + self.margin)))
+        return self.merge_overlapping(rois)
+
+    @staticmethod
+    def merge_overlapping(rois):
+        """
+        :param rois: List of (x0, y0, x1, y1) regions.
+        :return: List of regions where overlapping regions are replaced by their bounding region.
+        """
+        rois = list(rois)
+        merged = True
+        while merged:
+            merged = False
+            for i in range(len(rois)):
+                for j in range(i + 1, len(rois)):
+                    a, b = rois[i], rois[j]
+                    if a[0] < b[2] and b[0] < a[2] and a[1] < b[3] and b[1] < a[3]:
+                        rois[i] = (min(a[0], b[0]), min(a[1], b[1]), max(a[2], b[2]), max(a[3], b[3]))
+                        del rois[j]
+                        merged = True
+                        break
+                if merged:
+                    break
+        return rois
+
+    def _rois_for(self, image):
+        with self._lock:
+            if (self.reuse_mask and self._cached_shape == image.shape
+                    and self._frames_since_scan < self.rescan_interval):
+                self._frames_since_scan += 1
+                return self._cached_rois
+
+        rois = self.locate_boxes(image)
+        with self._lock:
+            self.scans += 1
+            self._cached_rois, self._cached_shape, self._frames_since_scan = rois, image.shape, 1
+        return rois
+
+    def box_mask(self, crop):
+        """
+        :param crop: BGR crop of a box region.
+        :return: Dilated mask of the temperature box pixels of the crop.
+        """
+        hsv_crop = cv2.cvtColor(crop, cv2.COLOR_BGR2HSV)
+        mask = np.zeros(crop.shape[:2], np.uint8)
+        for lower, upper in self.hsv_ranges:
+            mask |= cv2.inRange(hsv_crop, np.array(lower), np.array(upper))
+        return cv2.dilate(mask, np.ones((5, 5), np.uint8), iterations=1)
+
+    def remove(self, image):
+        """
+        Remove the temperature boxes of a frame.
+
+        :param image: BGR image, single channel images have no colored boxes and are returned as they are.
+        :return: BGR image with no boxes, or a single channel image if grayscale or if the input had one channel.
+        """
+        if image.ndim == 2:
+            return image
+
+        output = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY) if self.grayscale else image.copy()
+        for x0, y0, x1, y1 in self._rois_for(image):
+            mask = self.box_mask(image[y0:y1, x0:x1])
+            if not cv2.countNonZero(mask):
+                continue
+            crop = np.ascontiguousarray(output[y0:y1, x0:x1])
+            crop = cv2.inpaint(crop, mask, inpaintRadius=5, flags=cv2.INPAINT_TELEA)
+            output[y0:y1, x0:x1] = cv2.GaussianBlur(crop, (5, 5), 0)
+        return output
@@ -0,0 +1,20 @@
+import os
+import threading
+
+
+def atomic_write(path, writer):
+    """
+    Write a file through a temporary file in the same directory that replaces it once complete. Concurrent
+    writers of the same path then each replace it whole, and readers never see a partial file.
+
+    :param path: Path of the file to write.
+    :param writer: Function writing the content to the temporary file path it is given.
+    """
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        writer(tmp_path)
+        os.replace(tmp_path, path)
+    finally:
+        # Left behind only when the writer failed, e.g. on a full disk
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
@@ -0,0 +1,37 @@
+import os
+
+import pytest
+
+from src.utils.atomic_write import atomic_write
+
+
+def write_text(text):
+    def write(temporary_path):
+        with open(temporary_path, 'w') as f:
+            f.write(text)
+    return write
+
+
+def test_replaces_file(tmp_path):
+    path = tmp_path / "entry.txt"
+    path.write_text("old")
+
+    atomic_write(str(path), write_text("new"))
+
+    assert path.read_text() == "new"
+    assert os.listdir(tmp_path) == ["entry.txt"]
+
+
+def test_failed_write_keeps_file_and_removes_temporary_file(tmp_path):
+    path = tmp_path / "entry.txt"
+    path.write_text("old")
+
+    def fail(temporary_path):
+        write_text("partial")(temporary_path)
+        raise OSError("No space left on device")
+
+    with pytest.raises(OSError):
+        atomic_write(str(path), fail)
+
+    assert path.read_text() == "old"
+    assert os.listdir(tmp_path) == ["entry.txt"]
@@ -0,0 +1,71 @@
+import asyncio
+from types import SimpleNamespace
+
+from src.pipelines.FrameExecutor import EarlyExitPolicy, FrameExecutor
+
+
+def no_hands():
+    return SimpleNamespace(hand_landmarks=[], gestures=[], handedness=[])
+
+
+def confident_hands(count=2):
+    hand = SimpleNamespace(score=0.9)
+    return SimpleNamespace(hand_landmarks=[[SimpleNamespace(x=0.5, y=0.5, z=0.0)] * 21] * count,
+                           gestures=[[SimpleNamespace(category_name="Open_Palm", score=0.9)]] * count,
+                           handedness=[[hand]] * count)
+
+
+class FakePipelineManager:
+    """
+    Runs every pipeline as a single stage returning its name, without the StageCache.
+    """
+
+    stage_cache = None
+
+    def no_boxes_stage(self):
+        return SimpleNamespace(identity=("no_boxes", "{}"))
+
+    def run_stage(self, stage, image, image_name, key=None):
+        return image
+
+    def pipeline_stages(self, pipeline):
+        return [SimpleNamespace(identity=(pipeline, "{}"))]
+
+    def run_stages(self, image, stages, image_name, input_key=None):
+        return stages[-1].identity[0]
+
+
+class FakeRecognizer:
+    def __init__(self, results):
+        self.results = results
+        self.calls = 0
+
+    def recognize_landmarks_gestures_from_image(self, image):
+        self.calls += 1
+        return self.results
+
+    def close(self):
+        pass
+
+
+def test_process_frame_inside_running_event_loop():
+    recognizers = [FakeRecognizer(no_hands()), FakeRecognizer(no_hands())]
+    with FrameExecutor(FakePipelineManager(), recognizers) as frame_executor:
+        async def caller():
+            return frame_executor.process_frame("image", "frame")
+
+        pipeline_results, _ = asyncio.run(caller())
+
+    assert list(pipeline_results) == ["siggraph17", "clahe"]
+    assert [recognizer.calls for recognizer in recognizers] == [1, 1]
+
+
+def test_early_exit_skips_expensive_pipelines():
+    colorized, clahe = FakeRecognizer(no_hands()), FakeRecognizer(confident_hands())
+    with FrameExecutor(FakePipelineManager(), [colorized, clahe], early_exit=EarlyExitPolicy()) as frame_executor:
+        for index in range(3):
+            pipeline_results, _ = frame_executor.process_frame("image", f"frame_{index}")
+
+    assert pipeline_results["siggraph17"] is None
+    assert colorized.calls == 0
+    assert clahe.calls == 3
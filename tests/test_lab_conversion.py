@@ -0,0 +1,29 @@
+import numpy as np
+import pytest
+
+color = pytest.importorskip("skimage.color")
+pytest.importorskip("torch")
+
+from src.benchmarks.lab_conversion import L_TOLERANCE, RGB_TOLERANCE, make_images
+from src.colorization.Zhang import lab2rgb_fast, rgb2l
+
+
+@pytest.fixture(scope="module")
+def images():
+    return make_images((120, 160))
+
+
+def test_rgb2l_matches_skimage(images):
+    img_rgb, _ = images
+    assert np.abs(rgb2l(img_rgb) - color.rgb2lab(img_rgb)[..., 0]).max() <= L_TOLERANCE
+
+
+def test_rgb2l_of_gray_matches_skimage(images):
+    img_gray = images[0][..., 0]
+    expected = color.rgb2lab(np.tile(img_gray[..., None], 3))[..., 0]
+    assert np.abs(rgb2l(img_gray) - expected).max() <= L_TOLERANCE
+
+
+def test_lab2rgb_fast_matches_skimage(images):
+    _, img_lab = images
+    assert np.abs(lab2rgb_fast(img_lab) - color.lab2rgb(img_lab)).max() <= RGB_TOLERANCE
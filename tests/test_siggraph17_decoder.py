@@ -0,0 +1,16 @@
+import pytest
+
+torch = pytest.importorskip("torch")
+pytest.importorskip("skimage")
+
+from src.benchmarks.siggraph17_decoder import legacy_forward, make_model_and_input
+
+
+def test_single_pass_decoder_matches_double_pass():
+    model, input_l = make_model_and_input()
+    with torch.inference_mode():
+        expected = legacy_forward(model, input_l)
+        actual = model(input_l)
+
+    assert actual.shape == expected.shape
+    assert torch.allclose(actual, expected, rtol=0, atol=1e-5)
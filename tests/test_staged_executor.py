@@ -0,0 +1,55 @@
+import threading
+
+import pytest
+
+from src.pipelines.StagedExecutor import StagedExecutor
+
+TIMEOUT = 5
+
+
+def run_in_thread(executor, items):
+    """
+    Consume executor.run(items) on a thread, so that a hang fails the test instead of blocking it.
+    """
+    outcome = {}
+
+    def consume():
+        try:
+            outcome["outputs"] = list(executor.run(items))
+        except Exception as e:
+            outcome["error"] = e
+
+    thread = threading.Thread(target=consume, daemon=True)
+    thread.start()
+    thread.join(TIMEOUT)
+    assert not thread.is_alive(), "StagedExecutor.run did not return"
+    return outcome
+
+
+def test_outputs_keep_input_order():
+    executor = StagedExecutor([("double", lambda x: 2 * x), ("increment", lambda x: x + 1)], queue_size=1)
+    outcome = run_in_thread(executor, range(20))
+    assert outcome["outputs"] == [2 * x + 1 for x in range(20)]
+    assert executor.occupancy()["double"]["processed"] == 20
+
+
+def test_stage_error_is_raised():
+    def fail_on_three(x):
+        if x == 3:
+            raise RuntimeError("stage failed")
+        return x
+
+    outcome = run_in_thread(StagedExecutor([("fail", fail_on_three)]), range(10))
+    assert isinstance(outcome["error"], RuntimeError)
+
+
+@pytest.mark.parametrize("failing_index", [0, 5])
+def test_input_error_is_raised(failing_index):
+    def items():
+        for index in range(10):
+            if index == failing_index:
+                raise ValueError("could not read the input")
+            yield index
+
+    outcome = run_in_thread(StagedExecutor([("identity", lambda x: x)]), items())
+    assert isinstance(outcome["error"], ValueError)